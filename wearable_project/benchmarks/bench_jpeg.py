@@ -0,0 +1,87 @@
+"""
+Compare frame encoders on a real video: the original fixed-quality
+cv2.imencode path vs FrameEncoder (OpenCV and, if installed, libjpeg-turbo),
+with and without a byte budget.
+
+    python wearable_project/benchmarks/bench_jpeg.py demo/test.mp4 --frames 200 --target-bytes 40000
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wearable_project.settings')
+
+import django
+
+django.setup()
+
+from videostream.encoding import FrameEncoder, get_turbo
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark JPEG encoding of video frames')
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--target-bytes', type=int, default=40000)
+    return parser.parse_args()
+
+
+def load_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(name, encode, frames):
+    encode(frames[0])  # Warm-up
+    total_bytes = 0
+    start = time.perf_counter()
+    for frame in frames:
+        total_bytes += len(encode(frame))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34}{len(frames) / elapsed:>10.1f} fps{elapsed / len(frames) * 1000:>10.2f} ms"
+          f"{total_bytes / len(frames) / 1024:>10.1f} KB")
+
+
+def main():
+    args = parse_args()
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        raise SystemExit(f"Could not read frames from {args.video}")
+    print(f"{len(frames)} frames at {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    def baseline(frame):
+        # The encoder process_frame used before FrameEncoder
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        return base64.b64encode(buffer).decode('utf-8')
+
+    run('cv2.imencode q85 + base64', baseline, frames)
+
+    encoder = FrameEncoder()
+    encoder._turbo = None
+    run('FrameEncoder opencv q85', encoder.encode, frames)
+
+    encoder = FrameEncoder(target_bytes=args.target_bytes)
+    encoder._turbo = None
+    run(f'FrameEncoder opencv {args.target_bytes} B', encoder.encode, frames)
+
+    if get_turbo() is not None:
+        run('FrameEncoder turbojpeg q85', FrameEncoder().encode, frames)
+        run(f'FrameEncoder turbojpeg {args.target_bytes} B', FrameEncoder(target_bytes=args.target_bytes).encode, frames)
+    else:
+        print("PyTurboJPEG not installed, skipping libjpeg-turbo runs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare WebSocket message serialization: the original json.dumps of a dict
+holding the base64 image vs MessageSerializer (JSON with the image spliced
+in, orjson when installed, and MessagePack with raw JPEG bytes).
+
+    python wearable_project/benchmarks/bench_serialization.py --image-bytes 250000 --iterations 2000
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from videostream.serialization import MessageSerializer, msgpack, orjson
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark WebSocket message serialization')
+    parser.add_argument('--image-bytes', type=int, default=250000, help='Size of the JPEG in a frame message')
+    parser.add_argument('--iterations', type=int, default=2000)
+    return parser.parse_args()
+
+
+def frame_message():
+    return {
+        'stage': 'submucosal_dissection',
+        'confidences': [1.25, 3.5, 0.75, 2.0, 90.25, 2.25],
+        'inference_time': 41.37,
+        'timestamp': time.time(),
+        'elapsed_time': 123.45,
+        'replayed': False,
+        'position': 3710,
+        'video_time': 123.67,
+        'webcam_mode': False,
+        'seq': 1234,
+    }
+
+
+def status_message():
+    return {
+        'status_update': True,
+        'model_info': 'ResNet (Surgical Phase)',
+        'resolution': '1920x1080',
+        'avg_inference_time': '41.37 ms',
+        'paused': False,
+        'webcam_mode': False,
+        'inference_mode': 'standard',
+        'transport': {'quality': 85, 'scale': 1.0, 'level': 0, 'sent': 1200, 'dropped': 3, 'in_flight': 1},
+        'timestamp': time.time(),
+    }
+
+
+def bench(name, fn, iterations):
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        size = len(fn())
+    elapsed = time.perf_counter() - start
+    print(f"{name:<36} {elapsed / iterations * 1e6:9.1f} us/msg  {size:>9} bytes")
+
+
+def main():
+    args = parse_args()
+    jpeg = os.urandom(args.image_bytes)  # JPEG data is close to incompressible, like random bytes
+    print(f"orjson: {'yes' if orjson else 'no'}, msgpack: {'yes' if msgpack else 'no'}, "
+          f"image: {args.image_bytes} bytes\n")
+
+    def baseline_frame():
+        message = frame_message()
+        message['image'] = base64.b64encode(jpeg).decode('utf-8')
+        return json.dumps(message)
+
+    json_serializer = MessageSerializer('json')
+    bench('frame: json.dumps (original)', baseline_frame, args.iterations)
+    bench('frame: MessageSerializer json', lambda: json_serializer.dumps(frame_message(), jpeg), args.iterations)
+    if msgpack is not None:
+        msgpack_serializer = MessageSerializer('msgpack')
+        bench('frame: MessageSerializer msgpack', lambda: msgpack_serializer.dumps(frame_message(), jpeg), args.iterations)
+
+    bench('status: json.dumps (original)', lambda: json.dumps(status_message()), args.iterations)
+    bench('status: MessageSerializer json', lambda: json_serializer.dumps(status_message()), args.iterations)
+    if msgpack is not None:
+        bench('status: MessageSerializer msgpack', lambda: msgpack_serializer.dumps(status_message()), args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# dataset settings: pre-decoded memory-mapped shards from tools/pack_shards.py
+custom_imports = dict(imports=['custom.shard_dataset'], allow_failed_imports=False)
+
+dataset_type = 'ShardDataset'
+
+train_pipeline = [
+    dict(type='LoadImageFromShard'),
+    dict(type='EfficientNetRandomCrop', scale=224, backend='pillow'),
+    dict(type='RandomFlip', prob=0.5, direction='horizontal'),
+    dict(type='PackInputs'),
+]
+
+test_pipeline = [
+    dict(type='LoadImageFromShard'),
+    dict(type='EfficientNetCenterCrop', crop_size=256, backend='pillow'),
+    dict(type='PackInputs'),
+]
+
+# Workers only slice memory maps, so keep them alive between epochs
+train_dataloader = dict(
+    batch_size=256,
+    num_workers=5,
+    persistent_workers=True,
+    pin_memory=True,
+    dataset=dict(
+        type=dataset_type,
+        data_root=r'C:\Users\t_shi\Desktop\5757projectdata\shards\train',
+        ann_file='meta.json',
+        pipeline=train_pipeline),
+    sampler=dict(type='DefaultSampler', shuffle=True),
+)
+
+val_dataloader = dict(
+    batch_size=32,
+    num_workers=5,
+    persistent_workers=True,
+    pin_memory=True,
+    dataset=dict(
+        type=dataset_type,
+        data_root=r'C:\Users\t_shi\Desktop\5757projectdata\shards\val',
+        ann_file='meta.json',
+        pipeline=test_pipeline),
+    sampler=dict(type='DefaultSampler', shuffle=False),
+)
+val_evaluator = dict(type='Accuracy', topk=(1, ))
+
+test_dataloader = val_dataloader
+test_evaluator = val_evaluator
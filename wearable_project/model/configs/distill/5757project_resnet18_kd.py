@@ -0,0 +1,36 @@
+# Knowledge distillation: ResNet-18 student trained against the ResNet-50 epoch_100.pth teacher
+_base_ = ['../resnet/5757project_resnet18.py']
+
+# Registers DistillImageClassifier (wearable_project/model must be on sys.path, see tools/distill.py)
+custom_imports = dict(imports=['custom.distill'], allow_failed_imports=False)
+
+model = dict(
+    type='DistillImageClassifier',
+    teacher_config='{{fileDirname}}/../resnet/5757project.py',
+    teacher_checkpoint='{{fileDirname}}/../../epoch_100.pth',
+    temperature=4.0,
+    alpha=0.7,
+    backbone=dict(
+        # ImageNet-pretrained ResNet-18 from the mmpretrain model zoo
+        init_cfg=dict(
+            type='Pretrained',
+            checkpoint='https://download.openmmlab.com/mmclassification/v0/resnet/resnet18_8xb32_in1k_20210831-fbbb1da6.pth',
+            prefix='backbone',
+        )),
+)
+
+# The teacher runs on every batch too, so use a batch size that fits one GPU
+train_dataloader = dict(batch_size=128)
+
+optim_wrapper = dict(
+    optimizer=dict(type='SGD', lr=0.05, momentum=0.9, weight_decay=1e-4),
+    paramwise_cfg=dict(bias_decay_mult=0., norm_decay_mult=0.),
+)
+
+param_scheduler = [
+    dict(type='LinearLR', start_factor=1e-3, by_epoch=True, begin=0, end=5, convert_to_iter_based=True),
+    dict(type='CosineAnnealingLR', T_max=55, by_epoch=True, begin=5, end=60),
+]
+
+train_cfg = dict(by_epoch=True, max_epochs=60, val_interval=1)
+default_hooks = dict(checkpoint=dict(type='CheckpointHook', interval=5, save_best='auto'))
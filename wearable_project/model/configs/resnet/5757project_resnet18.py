@@ -0,0 +1,37 @@
+# Small gating model for cascade inference; same data and pipelines as 5757project.py
+_base_ = [
+    '../models/resnet18.py',
+    '../datasets/5757project.py',
+    '../schedules/imagenet_bs256.py',
+    '../default_runtime.py',
+]
+
+train_pipeline = [
+    dict(type='LoadImageFromFile'),
+    dict(type='EfficientNetRandomCrop', scale=224, backend='pillow'),
+    dict(type='RandomFlip', prob=0.5, direction='horizontal'),
+    dict(type='PackInputs'),
+]
+
+test_pipeline = [
+    dict(type='LoadImageFromFile'),
+    dict(type='EfficientNetCenterCrop', crop_size=256, backend='pillow'),
+    dict(type='PackInputs'),
+]
+
+train_dataloader = dict(
+    dataset=dict(pipeline=train_pipeline),
+    persistent_workers=False
+)
+val_dataloader = dict(
+    dataset=dict(pipeline=test_pipeline),
+    persistent_workers=False
+)
+test_dataloader = dict(
+    dataset=dict(pipeline=test_pipeline),
+    persistent_workers=False
+)
+
+train_cfg = dict(by_epoch=True, max_epochs=100, val_interval=1)
+val_cfg = dict()
+test_cfg = dict()
@@ -0,0 +1,21 @@
+# Same model and schedule as 5757project.py, trained from memory-mapped shards
+_base_ = [
+    '../models/resnet50.py',
+    '../datasets/5757project_shards.py',
+    '../schedules/imagenet_bs256.py',
+    '../default_runtime.py',
+]
+
+optim_wrapper = dict(
+    optimizer=dict(type='SGD', lr=0.08, momentum=0.9, weight_decay=1e-4),
+    paramwise_cfg=dict(bias_decay_mult=0., norm_decay_mult=0.),
+)
+
+param_scheduler = [
+    dict(type='LinearLR', start_factor=1e-6, by_epoch=True, begin=0, end=10, convert_to_iter_based=True),
+    dict(type='CosineAnnealingLR', T_max=40, by_epoch=True, begin=5, end=100),
+]
+
+train_cfg = dict(by_epoch=True, max_epochs=100, val_interval=1)
+val_cfg = dict()
+test_cfg = dict()
@@ -0,0 +1 @@
+# Project-specific mmpretrain modules, pulled into configs via `custom_imports`
@@ -0,0 +1,61 @@
+# custom/distill.py
+import torch
+import torch.nn.functional as F
+from mmengine.config import Config
+from mmengine.runner import load_checkpoint
+from mmpretrain.models import ImageClassifier
+from mmpretrain.registry import MODELS
+
+
+@MODELS.register_module()
+class DistillImageClassifier(ImageClassifier):
+    """
+    ImageClassifier trained against a frozen teacher.
+
+    The loss is (1 - alpha) * cross-entropy on the labels plus
+    alpha * T^2 * KL(teacher || student) on temperature-softened logits.
+    Only the student is used at inference time; `student_state_dict` strips
+    the teacher so the result loads into a plain ImageClassifier config.
+    """
+
+    def __init__(self, teacher_config, teacher_checkpoint, temperature=4.0, alpha=0.7, **kwargs):
+        super().__init__(**kwargs)
+        teacher_cfg = Config.fromfile(teacher_config).model
+        # The teacher's weights come from its checkpoint, never from its pretraining init
+        teacher_cfg.backbone.pop('init_cfg', None)
+        self.teacher = MODELS.build(teacher_cfg)
+        self.teacher_checkpoint = teacher_checkpoint
+        self.temperature = temperature
+        self.alpha = alpha
+        for param in self.teacher.parameters():
+            param.requires_grad = False
+
+    def init_weights(self):
+        super().init_weights()
+        # The runner initialises weights after construction, so load the teacher last
+        load_checkpoint(self.teacher, self.teacher_checkpoint, map_location='cpu')
+
+    def train(self, mode=True):
+        super().train(mode)
+        self.teacher.eval()  # Keep BatchNorm statistics frozen
+        return self
+
+    def loss(self, inputs, data_samples):
+        feats = self.extract_feat(inputs)
+        losses = self.head.loss(feats, data_samples)
+        losses['loss'] = losses['loss'] * (1 - self.alpha)
+
+        with torch.no_grad():
+            teacher_logits = self.teacher.head(self.teacher.extract_feat(inputs))
+        student_logits = self.head(feats)
+
+        t = self.temperature
+        losses['loss_kd'] = F.kl_div(
+            F.log_softmax(student_logits / t, dim=1),
+            F.softmax(teacher_logits / t, dim=1),
+            reduction='batchmean',
+        ) * (t * t) * self.alpha
+        return losses
+
+    def student_state_dict(self):
+        return {key: value for key, value in self.state_dict().items() if not key.startswith('teacher.')}
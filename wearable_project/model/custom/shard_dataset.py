@@ -0,0 +1,59 @@
+# custom/shard_dataset.py
+import json
+import os
+
+import numpy as np
+from mmcv.transforms import BaseTransform
+from mmpretrain.datasets import BaseDataset
+from mmpretrain.registry import DATASETS, TRANSFORMS
+
+
+@DATASETS.register_module()
+class ShardDataset(BaseDataset):
+    """
+    Dataset over shards written by tools/pack_shards.py.
+
+    `ann_file` is the shards' meta.json (relative to `data_root`). Samples only
+    reference (shard, row); pixels are read by LoadImageFromShard.
+    """
+
+    def __init__(self, ann_file='meta.json', **kwargs):
+        super().__init__(ann_file=ann_file, **kwargs)
+
+    def load_data_list(self):
+        with open(self.ann_file) as f:
+            meta = json.load(f)
+        root = os.path.dirname(self.ann_file)
+        labels = np.load(os.path.join(root, 'labels.npy'))
+        self._metainfo['classes'] = tuple(meta['classes'])
+
+        data_list, offset = [], 0
+        for shard in meta['shards']:
+            shard_path = os.path.join(root, shard['file'])
+            for row in range(shard['count']):
+                data_list.append(dict(shard_path=shard_path, shard_index=row, gt_label=int(labels[offset + row])))
+            offset += shard['count']
+        return data_list
+
+
+@TRANSFORMS.register_module()
+class LoadImageFromShard(BaseTransform):
+    """
+    Replacement for LoadImageFromFile: copies one image out of a memory-mapped
+    shard. Maps are opened once per worker process and then reused, so with
+    persistent workers the page cache does all the I/O.
+    """
+
+    def __init__(self):
+        self._shards = {}
+
+    def transform(self, results):
+        shard = self._shards.get(results['shard_path'])
+        if shard is None:
+            shard = np.load(results['shard_path'], mmap_mode='r')
+            self._shards[results['shard_path']] = shard
+        img = np.array(shard[results['shard_index']])  # Writable copy for the in-place transforms
+        results['img'] = img
+        results['img_shape'] = img.shape[:2]
+        results['ori_shape'] = img.shape[:2]
+        return results
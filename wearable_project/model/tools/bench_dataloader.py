@@ -0,0 +1,77 @@
+"""
+Measure training data pipeline throughput (samples/second) for file-based
+loading vs memory-mapped shards.
+
+    python wearable_project/model/tools/bench_dataloader.py \
+        --files-root /data/dataimage/train --shards-root /data/shards/train --epochs 2
+
+Each configuration iterates its train dataloader for `--epochs` passes (at
+most `--max-batches` batches each), so the cost of restarting
+non-persistent workers between epochs is included.
+"""
+import argparse
+import os
+import sys
+import time
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MODEL_DIR)  # So `custom_imports` can find the custom package
+
+from mmengine.config import Config
+from mmengine.registry import init_default_scope
+from mmengine.runner import Runner
+from mmengine.utils import import_modules_from_strings
+
+CONFIGS = {
+    'files': os.path.join(MODEL_DIR, 'configs', 'resnet', '5757project.py'),
+    'shards': os.path.join(MODEL_DIR, 'configs', 'resnet', '5757project_shards.py'),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark file-based vs shard-based data loading')
+    parser.add_argument('--files-root', help='Folder-per-class training set')
+    parser.add_argument('--shards-root', help='Output of tools/pack_shards.py for the same set')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--max-batches', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--num-workers', type=int, default=5)
+    return parser.parse_args()
+
+
+def bench(name, data_root, args):
+    cfg = Config.fromfile(CONFIGS[name])
+    if cfg.get('custom_imports'):
+        import_modules_from_strings(**cfg.custom_imports)
+    init_default_scope(cfg.get('default_scope', 'mmpretrain'))
+
+    loader_cfg = cfg.train_dataloader
+    loader_cfg.dataset.data_root = data_root
+    loader_cfg.batch_size = args.batch_size
+    loader_cfg.num_workers = args.num_workers
+    dataloader = Runner.build_dataloader(loader_cfg)
+
+    samples = 0
+    start = time.perf_counter()
+    for _ in range(args.epochs):
+        for i, batch in enumerate(dataloader):
+            samples += len(batch['inputs'])
+            if i + 1 >= args.max_batches:
+                break
+    elapsed = time.perf_counter() - start
+    return samples / elapsed
+
+
+def main():
+    args = parse_args()
+    results = {}
+    for name, root in (('files', args.files_root), ('shards', args.shards_root)):
+        if root:
+            results[name] = bench(name, root, args)
+            print(f"{name:<8}{results[name]:>10.1f} samples/s")
+    if len(results) == 2:
+        print(f"speed-up {results['shards'] / results['files']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
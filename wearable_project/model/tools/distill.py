@@ -0,0 +1,53 @@
+"""
+Train a compact student model by distilling epoch_100.pth.
+
+Run from the repository root:
+    python wearable_project/model/tools/distill.py --work-dir work_dirs/kd_resnet18
+
+The trained student (teacher weights stripped) is written to
+wearable_project/model/student.pth, where the cascade mode picks it up.
+"""
+import argparse
+import os
+import sys
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MODEL_DIR)  # So `custom_imports` can find the custom package
+
+import torch
+from mmengine.config import Config
+from mmengine.model import is_model_wrapper
+from mmengine.runner import Runner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Distill the surgical phase classifier into a small student')
+    parser.add_argument('--config', default=os.path.join(MODEL_DIR, 'configs', 'distill', '5757project_resnet18_kd.py'))
+    parser.add_argument('--work-dir', default='work_dirs/kd_resnet18')
+    parser.add_argument('--export', default=os.path.join(MODEL_DIR, 'student.pth'),
+                        help='Where to write the student-only checkpoint')
+    parser.add_argument('--train-root', help='Override train_dataloader.dataset.data_root')
+    parser.add_argument('--val-root', help='Override val_dataloader.dataset.data_root')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    cfg.work_dir = args.work_dir
+    if args.train_root:
+        cfg.train_dataloader.dataset.data_root = args.train_root
+    if args.val_root:
+        cfg.val_dataloader.dataset.data_root = args.val_root
+        cfg.test_dataloader.dataset.data_root = args.val_root
+
+    runner = Runner.from_cfg(cfg)
+    runner.train()
+
+    model = runner.model.module if is_model_wrapper(runner.model) else runner.model
+    torch.save({'meta': {'teacher': cfg.model.teacher_checkpoint}, 'state_dict': model.student_state_dict()}, args.export)
+    print(f"Student weights written to {args.export}")
+
+
+if __name__ == '__main__':
+    main()
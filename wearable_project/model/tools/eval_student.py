@@ -0,0 +1,79 @@
+"""
+Compare the teacher and student models: top-1 accuracy on the validation set
+and single-frame CPU throughput, printed side by side.
+
+    python wearable_project/model/tools/eval_student.py --val-root /data/dataimage/val
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+from mmpretrain import ImageClassificationInferencer
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+MODELS = {
+    'teacher (ResNet-50)': (os.path.join(MODEL_DIR, 'configs', 'resnet', '5757project.py'),
+                            os.path.join(MODEL_DIR, 'epoch_100.pth')),
+    'student (ResNet-18)': (os.path.join(MODEL_DIR, 'configs', 'resnet', '5757project_resnet18.py'),
+                            os.path.join(MODEL_DIR, 'student.pth')),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Evaluate teacher vs student accuracy and CPU speed')
+    parser.add_argument('--val-root', required=True, help='Folder-per-class validation set (CustomDataset layout)')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--speed-frames', type=int, default=100, help='Frames timed for the CPU throughput figure')
+    return parser.parse_args()
+
+
+def load_samples(val_root):
+    """(path, label) pairs with labels from sorted class folder names, as CustomDataset does"""
+    classes = sorted(d for d in os.listdir(val_root) if os.path.isdir(os.path.join(val_root, d)))
+    samples = []
+    for label, cls in enumerate(classes):
+        for root, _, files in os.walk(os.path.join(val_root, cls)):
+            samples.extend((os.path.join(root, f), label) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return samples
+
+
+def evaluate(config, weights, samples, batch_size, speed_frames):
+    inferencer = ImageClassificationInferencer(model=config, pretrained=weights, device='cpu')
+    paths = [path for path, _ in samples]
+    labels = np.array([label for _, label in samples])
+
+    results = inferencer(paths, batch_size=batch_size)
+    preds = np.array([result['pred_label'] for result in results])
+    accuracy = float((preds == labels).mean() * 100)
+
+    # Throughput the way the server runs it: one already-decoded RGB frame at a time
+    frames = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB) for path in paths[:speed_frames]]
+    inferencer(frames[0])  # Warm-up
+    start = time.perf_counter()
+    for frame in frames:
+        inferencer(frame)
+    fps = len(frames) / (time.perf_counter() - start)
+    return accuracy, fps
+
+
+def main():
+    args = parse_args()
+    samples = load_samples(args.val_root)
+    if not samples:
+        raise SystemExit(f"No images found under {args.val_root}")
+
+    print(f"{'model':<22}{'top-1 (%)':>12}{'CPU frames/s':>16}")
+    for name, (config, weights) in MODELS.items():
+        if not os.path.exists(weights):
+            print(f"{name:<22}{'missing weights':>28}")
+            continue
+        accuracy, fps = evaluate(config, weights, samples, args.batch_size, args.speed_frames)
+        print(f"{name:<22}{accuracy:>12.2f}{fps:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
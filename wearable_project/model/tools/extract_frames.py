@@ -0,0 +1,180 @@
+"""
+Build a training set from long surgical recordings.
+
+Videos are split into fixed-length time segments that are decoded in
+parallel worker processes, so throughput scales with cores even for a
+single multi-hour recording. Each worker samples frames at `--fps`, drops
+near-duplicates (perceptual dHash), resizes once to the training size and
+labels frames from the annotation timeline. Frames outside any annotated
+interval are skipped.
+
+Annotations are a CSV with a header row: video,start,end,label
+(start/end in seconds, video matched by file name).
+
+    python wearable_project/model/tools/extract_frames.py demo/test.mp4 \
+        --annotations annotations.csv --out /data/dataimage/train --fps 1
+
+By default images are written in the folder-per-class layout CustomDataset
+reads; --shards writes memory-mapped shards for ShardDataset instead.
+"""
+import argparse
+import bisect
+import csv
+import json
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from pack_shards import resize_short_edge
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract labelled training frames from videos in parallel')
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--annotations', required=True, help='CSV with video,start,end,label columns')
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--fps', type=float, default=1.0, help='Target sampling rate')
+    parser.add_argument('--size', type=int, default=288, help='Output short-edge length (aspect ratio is kept)')
+    parser.add_argument('--dedup-distance', type=int, default=4,
+                        help='Drop a frame if its 64-bit dHash is within this Hamming distance of the last kept one; -1 disables')
+    parser.add_argument('--segment-seconds', type=float, default=300.0, help='Length of the time slice each job decodes')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--shards', action='store_true', help='Write .npy shards instead of JPEG files')
+    parser.add_argument('--jpeg-quality', type=int, default=95)
+    return parser.parse_args()
+
+
+def load_annotations(path):
+    """{video file name: sorted [(start, end, label)]}"""
+    timelines = defaultdict(list)
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            timelines[os.path.basename(row['video'])].append((float(row['start']), float(row['end']), row['label']))
+    return {video: sorted(intervals) for video, intervals in timelines.items()}
+
+
+def label_at(intervals, starts, t):
+    pos = bisect.bisect_right(starts, t) - 1
+    if pos >= 0 and t < intervals[pos][1]:
+        return intervals[pos][2]
+    return None
+
+
+def dhash(img):
+    """64-bit difference hash of a BGR image"""
+    small = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def extract_segment(job):
+    """Worker: decode [start, end) of one video and write its kept frames"""
+    video_path, start, end, intervals, args = job
+    starts = [interval[0] for interval in intervals]
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+    step = 1.0 / args.fps
+    next_sample = start
+    last_hash = None
+    images, labels = [], []
+    written = 0
+    try:
+        while True:
+            # grab() skips colour conversion for frames we don't keep
+            if not cap.grab():
+                break
+            t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if t >= end:
+                break
+            if t < next_sample:
+                continue
+            next_sample += step * max(1, int((t - next_sample) // step) + 1)
+
+            label = label_at(intervals, starts, t)
+            if label is None:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            if args.dedup_distance >= 0:
+                frame_hash = dhash(frame)
+                if last_hash is not None and bin(frame_hash ^ last_hash).count('1') <= args.dedup_distance:
+                    continue
+                last_hash = frame_hash
+
+            frame = resize_short_edge(frame, args.size)
+            if args.shards:
+                images.append(frame)
+                labels.append(label)
+            else:
+                out_dir = os.path.join(args.out, label)
+                os.makedirs(out_dir, exist_ok=True)
+                name = f"{stem}_{int(t * 1000):09d}.jpg"
+                cv2.imwrite(os.path.join(out_dir, name), frame, [cv2.IMWRITE_JPEG_QUALITY, args.jpeg_quality])
+            written += 1
+    finally:
+        cap.release()
+
+    if args.shards and images:
+        name = f"{stem}_{int(start):07d}.npy"
+        np.save(os.path.join(args.out, name), np.stack(images))
+        return {'file': name, 'count': len(images), 'labels': labels}
+    return {'file': None, 'count': written, 'labels': []}
+
+
+def video_duration(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frames / fps if fps > 0 else 0.0
+    finally:
+        cap.release()
+
+
+def main():
+    args = parse_args()
+    timelines = load_annotations(args.annotations)
+    os.makedirs(args.out, exist_ok=True)
+
+    jobs = []
+    for video_path in args.videos:
+        intervals = timelines.get(os.path.basename(video_path))
+        if not intervals:
+            print(f"No annotations for {video_path}, skipping")
+            continue
+        duration = min(video_duration(video_path), intervals[-1][1])
+        start = intervals[0][0]
+        while start < duration:
+            jobs.append((video_path, start, min(start + args.segment_seconds, duration), intervals, args))
+            start += args.segment_seconds
+
+    results = []
+    with Pool(args.workers) as pool:
+        for result in pool.imap(extract_segment, jobs):
+            results.append(result)
+            print(f"\r{len(results)}/{len(jobs)} segments, {sum(r['count'] for r in results)} frames", end='', flush=True)
+    print()
+
+    if args.shards:
+        # Same layout as tools/pack_shards.py so ShardDataset can read it
+        classes = sorted({label for intervals in timelines.values() for _, _, label in intervals})
+        shards = [r for r in results if r['file']]
+        labels = np.array([classes.index(label) for r in shards for label in r['labels']], dtype=np.int16)
+        np.save(os.path.join(args.out, 'labels.npy'), labels)
+        with open(os.path.join(args.out, 'meta.json'), 'w') as f:
+            json.dump({
+                'classes': classes,
+                'size': args.size,
+                'channel_order': 'bgr',
+                'shards': [{'file': r['file'], 'count': r['count']} for r in shards],
+            }, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
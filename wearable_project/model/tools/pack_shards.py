@@ -0,0 +1,143 @@
+"""
+Pack a folder-per-class image set into memory-mapped uint8 shards.
+
+Every image is decoded once, resized so its short edge is SIZE, and written
+into .npy shards that ShardDataset reads with np.load(mmap_mode='r'), so
+training never re-opens or re-decodes the files. Frames keep their aspect
+ratio, so the training crops see the whole field of view as they do with the
+original JPEGs. Shards need one image shape, taken from the first image;
+images with a different aspect ratio are centre-cropped to it, and the tool
+reports how many were.
+
+    python wearable_project/model/tools/pack_shards.py /data/dataimage/train /data/shards/train
+    python wearable_project/model/tools/pack_shards.py /data/dataimage/val /data/shards/val
+
+Output layout:
+    meta.json              classes, image size, shard file names and counts
+    labels.npy             int16 label per sample, in shard order
+    shard_00000.npy ...    (count, height, width, 3) uint8 BGR images
+"""
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pack an image folder dataset into memory-mapped shards')
+    parser.add_argument('src', help='Folder-per-class dataset root (CustomDataset layout)')
+    parser.add_argument('dst', help='Output directory for the shards')
+    parser.add_argument('--size', type=int, default=288,
+                        help='Stored short-edge length; leave headroom above the 224/256 training crops')
+    parser.add_argument('--shard-size', type=int, default=4096, help='Images per shard file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    return parser.parse_args()
+
+
+def list_samples(src):
+    classes = sorted(d for d in os.listdir(src) if os.path.isdir(os.path.join(src, d)))
+    samples = []
+    for label, cls in enumerate(classes):
+        for root, _, files in os.walk(os.path.join(src, cls)):
+            samples.extend((os.path.join(root, f), label) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return classes, samples
+
+
+def short_edge_shape(img, size):
+    """(height, width) of `img` resized so its short edge is `size`"""
+    height, width = img.shape[:2]
+    scale = size / min(height, width)
+    return max(size, round(height * scale)), max(size, round(width * scale))
+
+
+def resize_to_shape(img, shape):
+    """Scale `img` until it covers `shape` (height, width), then centre-crop any excess"""
+    height, width = img.shape[:2]
+    target_height, target_width = shape
+    scale = max(target_height / height, target_width / width)
+    resized = cv2.resize(img, (max(target_width, round(width * scale)), max(target_height, round(height * scale))),
+                         interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    top = (resized.shape[0] - target_height) // 2
+    left = (resized.shape[1] - target_width) // 2
+    return resized[top:top + target_height, left:left + target_width]
+
+
+def resize_short_edge(img, size):
+    """Resize so the short edge is `size`, keeping the aspect ratio"""
+    return resize_to_shape(img, short_edge_shape(img, size))
+
+
+def pack_range(job):
+    """
+    Worker: decode one slice of a shard and write it straight into the memory map.
+    Returns (images packed, images whose aspect ratio differed and were cropped).
+    """
+    shard_path, offset, paths, size = job
+    shard = np.load(shard_path, mmap_mode='r+')
+    shape = shard.shape[1:3]
+    cropped = 0
+    for i, path in enumerate(paths):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"Could not decode {path}")
+        cropped += short_edge_shape(img, size) != shape
+        shard[offset + i] = resize_to_shape(img, shape)
+    shard.flush()
+    return len(paths), cropped
+
+
+def main():
+    args = parse_args()
+    classes, samples = list_samples(args.src)
+    if not samples:
+        raise SystemExit(f"No images found under {args.src}")
+    os.makedirs(args.dst, exist_ok=True)
+
+    # Recordings share one frame size, so the first image sets the shape of every shard
+    first = cv2.imread(samples[0][0], cv2.IMREAD_COLOR)
+    if first is None:
+        raise SystemExit(f"Could not decode {samples[0][0]}")
+    height, width = short_edge_shape(first, args.size)
+
+    shards, jobs = [], []
+    chunk = max(1, args.shard_size // max(args.workers, 1))
+    for start in range(0, len(samples), args.shard_size):
+        paths = [path for path, _ in samples[start:start + args.shard_size]]
+        name = f"shard_{len(shards):05d}.npy"
+        shard_path = os.path.join(args.dst, name)
+        # Preallocate the shard so workers can fill disjoint slices in parallel
+        np.lib.format.open_memmap(shard_path, mode='w+', dtype=np.uint8,
+                                  shape=(len(paths), height, width, 3)).flush()
+        shards.append({'file': name, 'count': len(paths)})
+        jobs.extend((shard_path, i, paths[i:i + chunk], args.size) for i in range(0, len(paths), chunk))
+
+    done = cropped = 0
+    with Pool(args.workers) as pool:
+        for count, job_cropped in pool.imap_unordered(pack_range, jobs):
+            done += count
+            cropped += job_cropped
+            print(f"\r{done}/{len(samples)} images packed", end='', flush=True)
+    print()
+    if cropped:
+        print(f"{cropped} images had a different aspect ratio and were centre-cropped to {width}x{height}")
+
+    np.save(os.path.join(args.dst, 'labels.npy'), np.array([label for _, label in samples], dtype=np.int16))
+    with open(os.path.join(args.dst, 'meta.json'), 'w') as f:
+        json.dump({
+            'classes': classes,
+            'size': args.size,
+            'height': height,
+            'width': width,
+            'channel_order': 'bgr',
+            'shards': shards,
+        }, f, indent=1)
+    print(f"Wrote {len(shards)} shards to {args.dst}")
+
+
+if __name__ == '__main__':
+    main()
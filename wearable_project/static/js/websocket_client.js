@@ -8,13 +8,19 @@ class SurgicalWorkflowClient {
     constructor(options = {}) {
         this.wsUrl = options.wsUrl || 'ws://' + window.location.host + '/ws/stream/';
         this.onVideoUpdate = options.onVideoUpdate || (() => {});
+        this.onVideoSegment = options.onVideoSegment || (() => {}); // fMP4 chunks for a MediaSource SourceBuffer
+        // 'msgpack' (needs the @msgpack/msgpack bundle loaded as window.MessagePack) asks for
+        // binary MessagePack messages; images then arrive as JPEG bytes (Uint8Array) instead of base64
+        this.wireFormat = options.wireFormat || 'json';
         this.onPhaseUpdate = options.onPhaseUpdate || (() => {});
+        this.onMultiUpdate = options.onMultiUpdate || (() => {}); // Per-source results in multi-source mode
         this.onConnectionChange = options.onConnectionChange || (() => {});
         this.onError = options.onError || (() => {});
         this.autoReconnect = options.autoReconnect !== false;
         this.reconnectDelay = options.reconnectDelay || 2000;
         this.maxReconnectAttempts = options.maxReconnectAttempts || 5;
         this.reconnectAttempts = 0;
+        this.resumeToken = null; // Issued by the server; reconnecting with it continues the stream
         
         this.ws = null;
         this.connected = false;
@@ -33,7 +39,13 @@ class SurgicalWorkflowClient {
         
         try {
             console.log("Connecting to WebSocket at:", this.wsUrl);
-            this.ws = new WebSocket(this.wsUrl);
+            const protocols = this.wireFormat === 'msgpack' && window.MessagePack ? ['msgpack'] : [];
+            let url = this.wsUrl;
+            if (this.resumeToken) {
+                url += (url.includes('?') ? '&' : '?') + 'resume=' + encodeURIComponent(this.resumeToken);
+            }
+            this.ws = new WebSocket(url, protocols);
+            this.ws.binaryType = 'arraybuffer';
             this.initEventHandlers();
         } catch (error) {
             this.onError(error);
@@ -74,7 +86,47 @@ class SurgicalWorkflowClient {
      */
     handleMessage(event) {
         try {
-            const data = JSON.parse(event.data);
+            let data;
+            if (event.data instanceof ArrayBuffer) {
+                if (this.ws.protocol !== 'msgpack') {
+                    // Binary messages are fMP4 video fragments (transport 'fmp4')
+                    this.onVideoSegment(event.data);
+                    return;
+                }
+                data = window.MessagePack.decode(new Uint8Array(event.data));
+            } else {
+                data = JSON.parse(event.data);
+            }
+            
+            // With MessagePack, fMP4 fragments travel inside the prediction message
+            if (data.segment) {
+                this.onVideoSegment(data.segment.slice().buffer);
+            }
+            
+            // Acknowledge frames so the server can adapt to our connection speed
+            if (data.seq !== undefined && this.connected) {
+                this.ws.send(JSON.stringify({ command: 'frame_ack', seq: data.seq }));
+            }
+            
+            // Remember the token so a dropped connection resumes where it stopped
+            if (data.status === 'connected') {
+                this.resumeToken = data.resume_token || null;
+            } else if (data.status === 'ended') {
+                this.resumeToken = null;
+            }
+            
+            // The server is draining for a restart: reconnect (to another node) after its hint
+            if (data.status === 'server_shutdown') {
+                this.reconnectAttempts = 0;
+                this.retryAfter = (data.retry_after || 0) * 1000;
+                return;
+            }
+            
+            // Multi-source mode: one message per tick with a result for every source
+            if (data.multi) {
+                this.onMultiUpdate(data.sources, data.tick_time, data.inference_time || 0);
+                return;
+            }
             
             // Process video frame data
             if (data.image) {
@@ -123,9 +175,12 @@ class SurgicalWorkflowClient {
             this.reconnectAttempts++;
             console.log(`Attempting to reconnect (${this.reconnectAttempts}/${this.maxReconnectAttempts})...`);
             
+            // A draining server's retry hint applies to the next attempt only
+            const delay = this.retryAfter || this.reconnectDelay;
+            this.retryAfter = 0;
             setTimeout(() => {
                 this.connect();
-            }, this.reconnectDelay);
+            }, delay);
         } else if (this.reconnectAttempts >= this.maxReconnectAttempts) {
             console.error('Max reconnection attempts reached. Giving up.');
         }
@@ -142,6 +197,54 @@ class SurgicalWorkflowClient {
         }
     }
     
+    /**
+     * Choose how frames are delivered: 'jpeg' (base64 image per message)
+     * or 'fmp4' (H.264 fragments as binary messages, predictions keyed by pts).
+     * fmp4 applies to backend video only; webcam results keep coming as JPEG.
+     */
+    setTransport(mode) {
+        if (this.connected) {
+            this.ws.send(JSON.stringify({ command: 'set_transport', mode: mode }));
+        }
+    }
+    
+    /**
+     * Switch to multi-source mode. `sources` is a list of
+     * {id: 'endoscope', video: '<catalogue id>'} for server-side videos or
+     * {id: 'room'} for sources fed with sendSourceFrame()
+     */
+    startMultiSession(sources) {
+        if (this.connected) {
+            this.ws.send(JSON.stringify({ command: 'start_multi', sources: sources }));
+        }
+    }
+    
+    /**
+     * Leave multi-source mode and return to single-source playback
+     */
+    stopMultiSession() {
+        if (this.connected) {
+            this.ws.send(JSON.stringify({ command: 'stop_multi' }));
+        }
+    }
+    
+    /**
+     * Send one JPEG frame (ArrayBuffer or Uint8Array) for a client-fed source,
+     * tagged with a length byte and the UTF-8 source ID
+     */
+    sendSourceFrame(sourceId, jpeg) {
+        if (!this.connected) {
+            return;
+        }
+        const id = new TextEncoder().encode(sourceId);
+        const body = jpeg instanceof Uint8Array ? jpeg : new Uint8Array(jpeg);
+        const message = new Uint8Array(1 + id.length + body.length);
+        message[0] = id.length;
+        message.set(id, 1);
+        message.set(body, 1 + id.length);
+        this.ws.send(message);
+    }
+    
     /**
      * Get the current connection status
      */
@@ -0,0 +1,158 @@
+# videostream/backpressure.py
+import asyncio
+import time
+
+
+class FrameFlowControl:
+    """
+    Outbound flow control for one WebSocket client's frame messages.
+
+    Frames are offered by the processing loop and taken by a separate sender
+    task. Only the newest unsent frame is kept: a newer frame supersedes one
+    that hasn't gone out yet, so a lagging client always receives the latest
+    prediction instead of a growing backlog.
+
+    Clients that acknowledge frames (`frame_ack` with the message's `seq`) get
+    a bounded in-flight window, and their ack latency drives a quality ladder
+    that lowers JPEG quality and frame size while they lag and restores it once
+    they keep up. Clients that never ack are sent every latest frame with no
+    window.
+    """
+
+    # (JPEG quality, scale factor) from best to most degraded
+    LEVELS = [(85, 1.0), (70, 1.0), (60, 0.75), (50, 0.5), (40, 0.5)]
+    MAX_IN_FLIGHT = 2  # Unacknowledged frames allowed before holding new ones
+    ACK_TIMEOUT = 2.0  # Seconds before outstanding frames are assumed lost
+    DEGRADE_LATENCY = 0.5  # Ack latency (s) above which quality steps down
+    RECOVER_LATENCY = 0.15  # Ack latency (s) below which quality may step back up
+    RECOVER_AFTER = 20  # Consecutive fast acks needed per upward step
+
+    def __init__(self):
+        self.level = 0
+        self.seq = 0
+        self.pending = None
+        self.in_flight = {}  # seq -> send time
+        self.acks_supported = False
+        self.ack_latency = 0.0  # Exponentially weighted, seconds
+        self.sent = 0
+        self.dropped = 0
+        self.fast_acks = 0
+        self.acks_since_change = 0
+        self.done = 0  # Last seq the sender has finished with, sent or failed
+        self._wakeup = asyncio.Event()
+        self._progress = asyncio.Event()
+
+    @property
+    def quality(self):
+        return self.LEVELS[self.level][0]
+
+    @property
+    def scale(self):
+        return self.LEVELS[self.level][1]
+
+    def offer(self, frame, message):
+        """Queue a frame message, superseding any frame that hasn't been sent yet"""
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = (frame, message)
+        self._wakeup.set()
+
+    def _window_open(self):
+        return not self.acks_supported or len(self.in_flight) < self.MAX_IN_FLIGHT
+
+    async def take(self):
+        """Wait for a frame that may be sent now; returns (seq, frame, message)"""
+        while True:
+            if self.pending is not None and self._window_open():
+                frame, message = self.pending
+                self.pending = None
+                self.seq += 1
+                return self.seq, frame, message
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.ACK_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._expire_in_flight()
+
+    def on_sent(self, seq):
+        self.in_flight[seq] = time.time()
+        self.sent += 1
+        self.on_done(seq)
+
+    def on_done(self, seq):
+        """The sender is finished with `seq`; on_sent calls this, failed sends call it directly"""
+        self.done = max(self.done, seq)
+        self._progress.set()
+
+    async def flush(self, timeout):
+        """Wait up to `timeout` seconds for the pending frame to go out; False if it didn't"""
+        deadline = time.monotonic() + timeout
+        while self.pending is not None or self.done < self.seq:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._progress.clear()
+            try:
+                await asyncio.wait_for(self._progress.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def on_ack(self, seq):
+        """Record a client acknowledgement and adapt the quality level"""
+        self.acks_supported = True
+        sent_at = self.in_flight.pop(seq, None)
+        # Acks are cumulative: anything older than this frame has been handled too
+        for old in [s for s in self.in_flight if s < seq]:
+            del self.in_flight[old]
+        if sent_at is not None:
+            latency = time.time() - sent_at
+            self.ack_latency = latency if not self.ack_latency else 0.8 * self.ack_latency + 0.2 * latency
+            self._adapt()
+        self._wakeup.set()
+
+    def _adapt(self):
+        self.acks_since_change += 1
+        if self.ack_latency > self.DEGRADE_LATENCY:
+            self.fast_acks = 0
+            # Let frames sent at the new level come back before judging it
+            if self.acks_since_change > self.MAX_IN_FLIGHT:
+                self._set_level(self.level + 1)
+        elif self.ack_latency < self.RECOVER_LATENCY:
+            self.fast_acks += 1
+            if self.fast_acks >= self.RECOVER_AFTER and self.level > 0:
+                self._set_level(self.level - 1)
+                self.fast_acks = 0
+        else:
+            self.fast_acks = 0
+
+    def _set_level(self, level):
+        level = min(max(level, 0), len(self.LEVELS) - 1)
+        if level != self.level:
+            self.level = level
+            self.acks_since_change = 0
+
+    def _expire_in_flight(self):
+        now = time.time()
+        expired = [seq for seq, sent_at in self.in_flight.items() if now - sent_at > self.ACK_TIMEOUT]
+        for seq in expired:
+            del self.in_flight[seq]
+        if expired:
+            self._set_level(self.level + 1)
+
+    def depth(self):
+        """Frames queued or sent but not yet acknowledged"""
+        return len(self.in_flight) + (self.pending is not None)
+
+    def stats(self):
+        """Summary for status messages"""
+        return {
+            'quality': self.quality,
+            'scale': self.scale,
+            'level': self.level,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'in_flight': len(self.in_flight),
+            'ack_latency': round(self.ack_latency * 1000, 1),
+            'acks_supported': self.acks_supported,
+        }
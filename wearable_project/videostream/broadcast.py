@@ -0,0 +1,171 @@
+# videostream/broadcast.py
+import asyncio
+import logging
+import time
+
+import cv2
+
+from .decoders import open_video
+from .encoding import encode_jpeg, get_encode_executor, get_turbo
+from .model_interface import get_classifier
+from .result_cache import get_result_cache
+from .scheduler import get_scheduler
+from .metrics import get_metrics
+from .scores import to_display
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SourceBroadcaster:
+    """
+    Decodes and classifies one catalogue video once and fans every result out
+    to any number of HTTP subscribers (MJPEG viewers, SSE listeners).
+
+    Each subscriber has a one-slot queue holding only the latest event, so a
+    slow reader skips frames instead of slowing the source down or growing a
+    backlog. The source runs while it has subscribers and loops at the end of
+    the video. When the inference scheduler has no room for another stream,
+    subscribers get a single {'error': ...} event instead.
+    """
+
+    FRAME_PROCESS_INTERVAL = 10  # Same stride as VideoStreamConsumer
+    JPEG_QUALITY = 80
+
+    def __init__(self, source):
+        self.source = source
+        self.subscribers = set()
+        self.task = None
+        self.latest = None
+        self.seq = 0
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        if self.latest is not None:
+            queue.put_nowait(self.latest)  # New viewers get a picture immediately
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def stop(self):
+        """Stop decoding regardless of subscribers (server shutdown)"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def refuse(self, reason):
+        """End every current subscriber's stream with an error event (not kept as `latest`)"""
+        event = {'error': reason}
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def publish(self, event):
+        self.latest = event
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()  # Drop the frame this subscriber hasn't read yet
+            queue.put_nowait(event)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        executor = get_encode_executor()
+        model = get_classifier()
+        stride = self.FRAME_PROCESS_INTERVAL
+        # All subscribers share one stream's worth of the inference budget
+        scheduler = get_scheduler()
+        stream_id = f"broadcast:{self.source['id']}"
+        if not scheduler.register(stream_id, priority='replay'):
+            # Unregistered streams aren't limited by admit(), so don't run outside the budget
+            logger.warning(f"Inference capacity reached, not broadcasting {self.source['id']}")
+            self.refuse('Server is at capacity, try again later')
+            return
+        metrics = get_metrics()
+        prediction = None
+        reading = None  # Decode running on the executor, if any
+        cap = await loop.run_in_executor(None, open_video, self.source['path'])
+        try:
+            if not cap.isOpened():
+                logger.error(f"Could not open {self.source['path']} for broadcasting")
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_delay = 1.0 / fps if fps > 0 else 0.033
+
+            # Replay cached predictions when this video has been analysed before
+            timeline = None
+            if model.model_version is not None:
+                cache = get_result_cache()
+                key = await loop.run_in_executor(None, cache.make_key, self.source['path'], model.model_version, stride)
+                timeline = await loop.run_in_executor(None, cache.load, key)
+
+            position = 0
+            while True:
+                reading = loop.run_in_executor(None, cap.read_at, position)
+                # Shielded: cancelling the task doesn't stop the worker thread, so cleanup waits for it
+                ret, frame, position = await asyncio.shield(reading)
+                reading = None
+                if not ret:
+                    if position == 0:
+                        break  # Nothing decodable at all
+                    # Loop the recording for dashboards
+                    position = 0
+                    continue
+
+                cached = timeline.get(position) if timeline is not None else None
+                if cached is not None:
+                    prediction = cached
+                elif prediction is None or scheduler.admit(stream_id):
+                    start_time = time.time()
+                    prediction = await loop.run_in_executor(None, model.predict, frame)
+                    metrics.record_inference(time.time() - start_time)
+                metrics.record_frame(
+                    stream_id,
+                    cache_hit=(cached is not None) if timeline is not None else None,
+                    queue_depth=sum(queue.qsize() for queue in self.subscribers)
+                )
+                stage, confidences = to_display(*prediction, model.CLASSES)
+                jpeg = await loop.run_in_executor(executor, encode_jpeg, frame, self.JPEG_QUALITY, get_turbo())
+
+                self.seq += 1
+                self.publish({
+                    'seq': self.seq,
+                    'jpeg': jpeg,
+                    'prediction': {
+                        'stage': stage,
+                        'confidences': confidences,
+                        'position': position,
+                        'video_time': round(position / fps, 2) if fps > 0 else 0,
+                        'timestamp': time.time(),
+                    },
+                })
+                position += stride
+                await asyncio.sleep(frame_delay)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error broadcasting {self.source['id']}: {e}", exc_info=True)
+        finally:
+            scheduler.unregister(stream_id)
+            metrics.remove_stream(stream_id)
+            if reading is not None:
+                await asyncio.wait({reading})  # Never release the decoder mid-decode
+            cap.release()
+
+
+# One broadcaster per catalogue source
+broadcasters = {}
+
+def get_broadcaster(source):
+    """Get or create the shared broadcaster for a catalogue entry"""
+    broadcaster = broadcasters.get(source['id'])
+    if broadcaster is None:
+        broadcaster = broadcasters[source['id']] = SourceBroadcaster(source)
+    return broadcaster
@@ -0,0 +1,179 @@
+# videostream/catalogue.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+from django.conf import settings
+
+from .video_index import get_index_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def probe_video(path):
+    """Read container metadata for a video file; returns None if it can't be opened"""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        return {
+            'fps': round(fps, 3) if fps > 0 else 0,
+            'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'codec': ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 '),
+        }
+    finally:
+        cap.release()
+
+
+class VideoCatalogue:
+    """
+    Scanned list of backend videos with their metadata.
+
+    Directories are rescanned at most every `rescan_interval` seconds and files
+    are only probed when their size or mtime changes, so looking up a source
+    per connection is a dictionary access. Entries persist across restarts.
+    """
+
+    def __init__(self, directories, cache_file, rescan_interval=60):
+        self.directories = [Path(d) for d in directories]
+        self.cache_file = Path(cache_file)
+        self.rescan_interval = rescan_interval
+        self.last_scan = 0
+        self._entries = self._load()
+        self._scan_lock = threading.Lock()  # One scan at a time; lookups never wait on it once entries exist
+
+    def _load(self):
+        try:
+            with open(self.cache_file) as f:
+                return {entry['id']: entry for entry in json.load(f)}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save(self):
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_file, 'w') as f:
+                json.dump(list(self._entries.values()), f, indent=1)
+        except OSError as e:
+            logger.warning(f"Could not persist video catalogue: {e}")
+
+    @staticmethod
+    def video_id(path):
+        return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+
+    def _is_fresh(self):
+        return time.time() - self.last_scan < self.rescan_interval
+
+    def refresh(self, force=False):
+        """
+        Rescan the source directories if the last scan is stale (blocking).
+        Indexing a new video can take minutes, so while another thread scans,
+        callers keep using the current entries; only the very first scan (or a
+        forced one) is waited for.
+        """
+        if not force and self._is_fresh():
+            return
+        if not self._scan_lock.acquire(blocking=force or not self._entries):
+            return  # Another thread is already rescanning
+        try:
+            if not force and self._is_fresh():
+                return  # Scanned while we waited
+            previous = self._entries
+            entries = {}
+            for directory in self.directories:
+                if not directory.is_dir():
+                    continue
+                for item in os.scandir(directory):
+                    if not item.is_file() or not item.name.lower().endswith(VIDEO_EXTENSIONS):
+                        continue
+                    entry = self._scan_file(item, previous)
+                    if entry:
+                        entries[entry['id']] = entry
+            # Readers only ever see a complete dict
+            self._entries = entries
+            self.last_scan = time.time()
+            if entries != previous:
+                self._save()
+                logger.info(f"Video catalogue has {len(entries)} sources")
+        finally:
+            self._scan_lock.release()
+
+    def _scan_file(self, item, previous):
+        path = item.path
+        stat = item.stat()
+        video_id = self.video_id(path)
+        cached = previous.get(video_id)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == int(stat.st_mtime):
+            return cached
+
+        metadata = probe_video(path)
+        if metadata is None:
+            logger.warning(f"Skipping unreadable video {path}")
+            return None
+        try:
+            # Building the index here also makes the first seek on this video fast
+            index = get_index_store().get(path)
+            # None rather than 0 when the backend can't see keyframe flags (OpenCV fallback)
+            metadata['keyframe_count'] = len(index.keyframes) or None
+            if index.frame_count:
+                metadata['frame_count'] = index.frame_count
+                metadata['duration'] = round(index.duration, 3)
+        except Exception as e:
+            logger.error(f"Error indexing {path}: {e}")
+            metadata['keyframe_count'] = None
+        metadata.setdefault('duration', round(metadata['frame_count'] / metadata['fps'], 3) if metadata['fps'] else 0)
+
+        return {
+            'id': video_id,
+            'name': item.name,
+            'path': path,
+            'size': stat.st_size,
+            'mtime': int(stat.st_mtime),
+            **metadata,
+        }
+
+    def list(self):
+        """All known sources, sorted by name, without local paths"""
+        self.refresh()
+        return [
+            {key: value for key, value in entry.items() if key != 'path'}
+            for entry in sorted(self._entries.values(), key=lambda e: e['name'])
+        ]
+
+    def get(self, video_id):
+        self.refresh()
+        return self._entries.get(video_id)
+
+    def default(self):
+        """First source by name, used when a client doesn't select one"""
+        self.refresh()
+        if not self._entries:
+            return None
+        return min(self._entries.values(), key=lambda e: e['name'])
+
+
+# Singleton instance
+catalogue = None
+
+def get_catalogue():
+    """Get or create singleton catalogue instance"""
+    global catalogue
+    if catalogue is None:
+        catalogue = VideoCatalogue(
+            getattr(settings, 'VIDEO_SOURCE_DIRS', ['demo']),
+            getattr(settings, 'VIDEO_CATALOGUE_FILE', 'cache/catalogue.json'),
+            rescan_interval=getattr(settings, 'VIDEO_CATALOGUE_RESCAN_INTERVAL', 60),
+        )
+    return catalogue
@@ -1,14 +1,36 @@
 import cv2
 import numpy as np
 import base64
+import functools
 import json
-import os
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.exceptions import StopConsumer
+from django.conf import settings
 import asyncio
 import time
+import uuid
+from urllib.parse import parse_qs
 from .model_interface import get_classifier
+from .recorder import get_recorder
+from .result_cache import get_result_cache, TimelineBuilder
+from .video_index import get_index_store
+from .catalogue import get_catalogue
+from .embeddings import EmbeddingRingBuffer
+from .backpressure import FrameFlowControl
+from .encoding import FrameEncoder, get_encode_executor
+from .transport import FragmentedMP4Encoder, TRANSPORT_MODES, fmp4_available
+from .scheduler import get_scheduler
+from .metrics import get_metrics
+from .scores import threshold_vector, to_display, top_k, top_k_display
+from .serialization import MessageSerializer, wire_formats_available
+from .decoders import open_video
+from .multisource import MultiSourceSession, parse_tagged_frame
+from .encoding import encode_jpeg
+from .lifecycle import get_lifecycle, track_in_flight
+from .sessions import get_session_store
+from .shadow import get_shadow
+from .replay import start_recording
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -16,29 +38,118 @@ logger = logging.getLogger(__name__)
 class VideoStreamConsumer(AsyncWebsocketConsumer):
     # Setup frame processing frequency
     FRAME_PROCESS_INTERVAL = 10  # Process every 3rd frame instead of 5th for better responsiveness
+    MIN_SPEED, MAX_SPEED = 0.1, 16.0  # Playback speed limits for set_speed
+    MULTI_TICK_INTERVAL = 1 / 3  # Seconds between batched inferences in multi-source mode
+    EMBEDDING_WINDOW = 16  # Recent embeddings kept per stream for the temporal head
+    DRAIN_FLUSH_TIMEOUT = 1.0  # Seconds a drain waits for the pending frame message to be sent
 
     async def connect(self):
-        await self.accept()
+        # Clients asking for the 'msgpack' subprotocol get binary MessagePack messages
+        requested = self.scope.get('subprotocols', [])
+        wire_format = next((f for f in wire_formats_available() if f in requested), 'json')
+        self.serializer = MessageSerializer(wire_format)
+        await self.accept(subprotocol=wire_format if wire_format in requested else None)
+        
+        # A node that is shutting down sends new streams elsewhere
+        self.lifecycle = get_lifecycle()
+        self.lifecycle.install()
+        if not self.lifecycle.admit(self):
+            await self.send_message({
+                'status': 'server_shutdown',
+                'reconnect': True,
+                'retry_after': self.lifecycle.retry_after,
+                'timestamp': time.time()
+            })
+            await self.close(code=1012)
+            return
+        
         self.frame_count = 0
         self.running = True
         self.paused = False
         self.webcam_mode = False  # Flag to indicate if we're processing webcam frames
+        self.camera_source = False  # Backend capture is a local camera rather than a video file
         self.start_time = time.time()
         self.last_prediction = None
         self.prediction_cache = {}  # Cache for recent predictions
         self.last_status_update = 0  # Track when we last sent status updates
+        self.session_id = uuid.uuid4().hex  # Key for persisted predictions
+        
+        # Every stream gets a share of the node's inference budget; refuse streams beyond capacity
+        self.scheduler = get_scheduler()
+        if not self.scheduler.register(self.session_id, priority='replay'):
+            logger.warning("Inference capacity reached, rejecting stream")
+            await self.send_message({
+                'error': 'Server is at capacity, try again later',
+                'timestamp': time.time()
+            })
+            await self.close(code=4503)
+            return
+        
+        self.recorder = get_recorder()
+        self.metrics = get_metrics()
+        self.shadow = get_shadow()  # Candidate model comparison, when one is configured
+        self.result_cache = get_result_cache()
+        self.timeline = None  # Cached predictions for the current video, if any
+        self.timeline_builder = None  # Collects predictions to cache after a full pass
+        self.timeline_key = None
+        self.position = 0  # Index of the last frame read from the video
+        self.speed = 1.0  # Playback speed multiplier
+        self.inference_mode = 'standard'  # One of SurgicalPhaseClassifier.INFERENCE_MODES
+        self.cascade_threshold = None  # This connection's escalation threshold; None uses the model default
         
         # Initialize variables for video capture
         self.cap = None
+        self.cap_lock = asyncio.Lock()  # Serialises decoding on worker threads
+        self.video_index = None  # Keyframe/timestamp index, loaded in the background
+        self.fps = 30
+        self.index_task = None
+        self.multi = None  # MultiSourceSession while in multi-source mode
+        
+        # Optional ?source=<id> selects a catalogue video for this connection
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.source_id = params.get('source', [None])[0]
         self.model = get_classifier()
+        self.client_frames = 0  # Webcam frames received, echoed as client_frame in their results
+        # With SESSION_RECORD_DIR set, the client's messages are saved for the replay_session command
+        self.traffic = start_recording(
+            self.session_id, self.scope.get('query_string', b'').decode(), self.model.model_version
+        )
+        self.embeddings = EmbeddingRingBuffer(self.EMBEDDING_WINDOW, self.model.EMBEDDING_DIM)
+        
+        # Frame messages go out through a sender task that adapts to the client's pace
+        self.flow = FrameFlowControl()
+        self.encoder = FrameEncoder(target_bytes=getattr(settings, 'JPEG_TARGET_BYTES', None))
+        self.transport_mode = 'jpeg'  # 'fmp4' sends an H.264 stream as binary messages instead
+        self.fmp4 = None
+        self.fmp4_lock = asyncio.Lock()  # Encoding and closing the fMP4 encoder never overlap
+        self.fmp4_encoding = None  # Encode running on the encode executor, if any
+        self.sender_task = asyncio.create_task(self.frame_sender())
+        
+        # ?resume=<token> continues a dropped stream; the token of this one goes out with 'connected'
+        self.sessions = get_session_store()
+        self.ended = False
+        resume_token = params.get('resume', [None])[0]
+        # A shared cache backend is network I/O, so the store is used off the event loop
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.sessions.take, resume_token) if resume_token else None
+        self.resume_token = resume_token if state is not None else self.sessions.issue_token()
         
         # Start the video streaming and processing task
-        self.task = asyncio.create_task(self.process_video())
-        logger.info("WebSocket connection established")
+        if state is not None:
+            self.restore_session(state)
+            logger.info(f"WebSocket connection resumed at frame {self.position}")
+        else:
+            self.task = asyncio.create_task(self.process_video())
+            logger.info("WebSocket connection established")
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection with proper cleanup"""
         logger.info(f"WebSocket disconnected with code: {close_code}")
+        # Keep the playback state around so the client can resume after a dropped connection
+        if hasattr(self, 'resume_token') and not self.ended and self.multi is None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.sessions.save, self.resume_token, self.session_state())
+        
         # Stop the main processing loop
         self.running = False
         self.paused = True  # Ensure paused state to prevent new processing
@@ -55,13 +166,30 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
             except Exception as e:
                 logger.error(f"Error canceling task: {e}")
         
+        # Stop background indexing; the worker thread finishes and caches it on its own
+        if getattr(self, 'index_task', None):
+            self.index_task.cancel()
+        if getattr(self, 'sender_task', None):
+            self.sender_task.cancel()
+        if getattr(self, 'fmp4', None) is not None:
+            await self.close_fmp4()
+        
+        if hasattr(self, 'lifecycle'):
+            self.lifecycle.remove(self)
+        if getattr(self, 'traffic', None) is not None:
+            self.traffic.close()
+        
+        # Hand this stream's share of the inference budget back
+        if hasattr(self, 'scheduler'):
+            self.scheduler.unregister(self.session_id)
+        if hasattr(self, 'metrics'):
+            self.metrics.remove_stream(self.session_id)
+        if getattr(self, 'multi', None) is not None:
+            await self.close_multi()
+        
         # Release video capture resources
-        if hasattr(self, 'cap') and self.cap and self.cap.isOpened():
-            try:
-                self.cap.release()
-                logger.info("Video resources released on disconnect")
-            except Exception as e:
-                logger.error(f"Error releasing video capture: {e}")
+        if hasattr(self, 'cap_lock'):
+            await self.release_capture()
         
         # Clear any large objects from memory
         self.prediction_cache = {}
@@ -70,71 +198,72 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
         # Raise StopConsumer to ensure proper cleanup by Channels
         raise StopConsumer()
 
-    async def process_video(self):
-        """Process video frames and run model inference"""
+    async def process_video(self, resumed=None):
+        """Process video frames and run model inference; `resumed` is a restored session state"""
         try:
             # Skip video setup if we're in webcam mode
             if not self.webcam_mode:
-                # Get video file path from demo directory
-                # First try to find a demo video in the model directory
+                # Look up the selected (or default) video in the shared catalogue
                 video_path = None
-                demo_dir = os.path.join('demo')
-                
-                # Look for common video files in the demo directory
-                if os.path.exists(demo_dir):
-                    for file in os.listdir(demo_dir):
-                        if file.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
-                            video_path = os.path.join(demo_dir, file)
-                            logger.info(f"Found video file: {video_path}")
-                            break
+                source = await self.resolve_source()
+                if source:
+                    video_path = source['path']
+                    self.source_id = source['id']
                 
-                # If no video found in demo directory, try a sample video path
-                if not video_path:
-                    # Try multiple possible paths for different environments
-                    possible_paths = [
-                        # For Windows
-                        r"demo/test.mp4",
-                        # A backup sample if available
-                        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test.mp4')
-                    ]
-                    
-                    for path in possible_paths:
-                        if os.path.exists(path):
-                            video_path = path
-                            logger.info(f"Using backup video path: {video_path}")
-                            break
-                
-                # If still no video file found, fall back to camera
+                # If no video file found, fall back to camera
+                loop = asyncio.get_running_loop()
                 if not video_path:
                     logger.warning("No video file found, falling back to camera")
-                    self.cap = cv2.VideoCapture(0)
+                    self.cap = await loop.run_in_executor(None, open_video, 0)
+                    self.camera_source = True
+                    self.scheduler.set_priority(self.session_id, self.stream_priority())
                 else:
                     logger.info(f"Using video file: {video_path}")
-                    self.cap = cv2.VideoCapture(video_path)
+                    # The first open may probe the decoder backends, so keep it off the event loop
+                    self.cap = await loop.run_in_executor(None, open_video, video_path)
                 
                 # Check if video opened successfully
                 if not self.cap.isOpened():
                     logger.error("Could not open video source")
-                    await self.send(text_data=json.dumps({
+                    await self.send_message({
                         'error': 'Could not open video source',
                         'timestamp': time.time()
-                    }))
+                    })
                     return
                 
                 # Get video properties
                 fps = self.cap.get(cv2.CAP_PROP_FPS)
                 frame_delay = 1.0 / fps if fps > 0 else 0.033  # Default to 30fps if not available
+                self.fps = fps if fps > 0 else 30
+                
+                # Reuse predictions from an earlier pass over the same recording
+                if video_path:
+                    await self.load_cached_timeline(video_path, fps)
+                    # The index only speeds up seeking, so don't hold playback for it
+                    self.index_task = asyncio.create_task(self.load_video_index(video_path))
             else:
                 # In webcam mode, we don't need a local video source
                 frame_delay = 0.033  # ~30fps for webcam processing
             
+            if resumed is not None:
+                # The source is open again; go back to the mode the stream was in
+                self.webcam_mode = resumed['webcam_mode']
+                self.paused = resumed['paused'] or self.webcam_mode
+                self.scheduler.set_priority(self.session_id, self.stream_priority())
+            
             # Notify client about successful connection
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'status': 'connected',
                 'fps': fps if not self.webcam_mode and 'fps' in locals() else 30,
                 'webcam_mode': self.webcam_mode,
+                'session_id': self.session_id,
+                'source': self.source_id,
+                'resume_token': self.resume_token,  # Reconnect with ?resume=<token> to continue
+                'resumed': resumed is not None,
+                'position': self.frame_count,
+                'paused': self.paused,
                 'timestamp': time.time()
-            }))
+            })
             
             while self.running:
                 # If paused, just sleep and continue the loop without processing
@@ -148,13 +277,21 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                     continue
                 
                 # Read frame from video - only in backend mode
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_count) 
-                ret, frame = self.cap.read()
+                self.position = self.frame_count
+                ret, frame, _ = await self.read_frame(self.position)
                 
                 # If frame is not read successfully (end of video), loop back to beginning
                 if not ret:
                     logger.info("End of video file reached, stopping...")
-                    self.disconnect("0")
+                    self.ended = True  # Nothing left to resume
+                    await self.store_timeline()
+                    await self.send_message({
+                        'status': 'ended',
+                        'position': self.position,
+                        'timestamp': time.time()
+                    })
+                    # The socket stays open: clients reconnect whenever it closes, which would
+                    # restart the video. They can still pick another source or switch to webcam.
                     break
                 
                 # Increment frame counter
@@ -166,11 +303,16 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                     if self.paused:
                         continue
                     
-                    # Process the frame
-                    await self.process_frame(frame)
+                    # Process the frame, replaying the cached prediction when there is one
+                    prediction = self.cached_prediction(self.position)
+                    admitted = False
+                    if prediction is None and self.building_timeline():
+                        # Every stride position is needed for the cache, so slow down rather than degrade
+                        admitted = await self.wait_for_budget()
+                    await self.process_frame(frame, prediction=prediction, admitted=admitted)
                 
                 # Control frame rate to match video FPS
-                await asyncio.sleep(frame_delay)
+                await asyncio.sleep(frame_delay / self.speed)
                 
         except asyncio.CancelledError:
             # Handle task cancellation
@@ -178,21 +320,517 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error in process_video: {e}", exc_info=True)
             # Notify client about the error
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'error': str(e),
                 'timestamp': time.time()
-            }))
+            })
         finally:
             # Release resources
+            await self.release_capture()
+    
+    async def resolve_source(self):
+        """Catalogue entry for the selected source, or the default one"""
+        catalogue = get_catalogue()
+        loop = asyncio.get_running_loop()
+        try:
+            # Only scans/probes when the catalogue is stale, otherwise a dict lookup
+            if self.source_id:
+                source = await loop.run_in_executor(None, catalogue.get, self.source_id)
+                if source:
+                    return source
+                logger.warning(f"Unknown video source {self.source_id}, using default")
+            return await loop.run_in_executor(None, catalogue.default)
+        except Exception as e:
+            logger.error(f"Error reading video catalogue: {e}")
+            return None
+
+    async def select_source(self, data):
+        """Handle the select_source command: restart backend playback on another video"""
+        source_id = data.get('source')
+        loop = asyncio.get_running_loop()
+        if not source_id or await loop.run_in_executor(None, get_catalogue().get, source_id) is None:
+            raise ValueError(f"Unknown video source: {source_id}")
+        
+        await self.stop_playback()
+        self.source_id = source_id
+        self.start_playback()
+
+    def stop_accepting(self):
+        """First step of a drain: playback loops exit after the frame they are on"""
+        self.running = False
+
+    async def drain(self, retry_after):
+        """Ask the client to reconnect elsewhere, then stop playback and release decoders"""
+        if self.task and not self.task.done():
+            # The loop notices running is False within one frame delay
+            await asyncio.wait({self.task}, timeout=1.0)
+        # The last classified frame goes out before the client is told to leave
+        if not await self.flow.flush(self.DRAIN_FLUSH_TIMEOUT):
+            logger.warning("Last frame not sent before the drain")
+        try:
+            await self.send_message({
+                'status': 'server_shutdown',
+                'reconnect': True,
+                'retry_after': retry_after,
+                'timestamp': time.time()
+            })
+        except Exception as e:
+            logger.warning(f"Could not notify client of shutdown: {e}")
+        await self.stop_playback()
+        if self.sender_task:
+            self.sender_task.cancel()
+        await self.close_fmp4()
+        await self.close(code=1012)  # Service restart
+
+    async def stop_playback(self):
+        """Stop the current playback task (single or multi-source) and release its captures"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.index_task:
+            self.index_task.cancel()
+        await self.release_capture()
+        if self.multi is not None:
+            await self.close_multi()
+
+    async def close_multi(self):
+        """Release a multi-source session's decoders and drop its per-source metrics"""
+        for source_id in self.multi.sources:
+            self.metrics.remove_stream(f"{self.session_id}:{source_id}")
+        session, self.multi = self.multi, None
+        await session.close()
+
+    def start_playback(self, position=0, resumed=None):
+        """Reset per-video state and start backend playback of self.source_id at frame `position`"""
+        self.cap = None
+        self.ended = False
+        self.frame_count = position
+        self.position = position
+        self.video_index = None
+        self.timeline = None
+        self.timeline_builder = None
+        self.timeline_key = None
+        self.embeddings.clear()
+        self.webcam_mode = False
+        self.camera_source = False
+        self.scheduler.set_priority(self.session_id, self.stream_priority())
+        self.paused = False
+        self.task = asyncio.create_task(self.process_video(resumed))
+
+    def session_state(self):
+        """Snapshot of what a resumed stream needs to continue where this one stopped"""
+        return {
+            'source_id': self.source_id,
+            'frame_count': self.frame_count,  # Next frame playback would have read
+            'paused': self.paused,
+            'webcam_mode': self.webcam_mode,
+            'inference_mode': self.inference_mode,
+            'cascade_threshold': self.cascade_threshold,
+            'speed': self.speed,
+            'transport_mode': self.transport_mode,
+            'target_bytes': self.encoder.target_bytes,
+            'start_time': self.start_time,
+            'last_prediction': self.last_prediction,
+            'embeddings': self.embeddings,  # The old connection is gone, so the buffer can move over
+        }
+
+    def restore_session(self, state):
+        """Continue a saved stream: reopen its source, seek to its frame and restore its context"""
+        self.source_id = state['source_id']
+        self.inference_mode = state['inference_mode']
+        self.cascade_threshold = state['cascade_threshold']
+        self.speed = state['speed']
+        self.transport_mode = state['transport_mode']
+        self.encoder.set_target(target_bytes=state['target_bytes'])
+        self.start_time = state['start_time']
+        # The decoder seeks straight to the saved frame rather than decoding from the start
+        self.start_playback(state['frame_count'], resumed=state)
+        self.embeddings = state['embeddings']
+        self.last_prediction = state['last_prediction']
+
+    async def resume_session(self, token):
+        """Handle resume with a token: take over a dropped stream's state on this connection"""
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.sessions.take, token)
+        if state is None:
+            raise ValueError("Unknown or expired session token")
+        await self.stop_playback()
+        self.resume_token = token
+        self.restore_session(state)
+
+    def stream_priority(self):
+        """Live camera frames are scheduled ahead of recorded video replays"""
+        if self.multi is not None:
+            return 'live' if self.multi.live else 'replay'
+        return 'live' if self.webcam_mode or self.camera_source else 'replay'
+
+    async def start_multi(self, data):
+        """
+        Handle start_multi: replace single-source playback with several named sources.
+        `sources` is a list of {'id': name, 'video': catalogue id} for server-side videos
+        or {'id': name} for sources the client feeds with tagged binary frames.
+        """
+        specs = data.get('sources') or []
+        if not specs:
+            raise ValueError("start_multi needs a list of sources")
+        thresholds = getattr(settings, 'PHASE_THRESHOLDS', None)
+        session = MultiSourceSession(
+            self.model, self.MULTI_TICK_INTERVAL,
+            thresholds=threshold_vector(thresholds, self.model.CLASSES) if thresholds else None,
+            top_k=getattr(settings, 'PREDICTION_TOP_K', 3),
+        )
+        loop = asyncio.get_running_loop()
+        for spec in specs:
+            video = None
+            if spec.get('video'):
+                video = await loop.run_in_executor(None, get_catalogue().get, spec['video'])
+                if video is None:
+                    raise ValueError(f"Unknown video source: {spec['video']}")
+            session.add_source(str(spec.get('id', '')), video)
+        
+        await self.stop_playback()
+        try:
+            await session.open()
+        except Exception:
+            await session.close()
+            raise
+        self.multi = session
+        self.webcam_mode = False
+        self.paused = False
+        self.scheduler.set_priority(self.session_id, self.stream_priority())
+        self.task = asyncio.create_task(self.process_multi())
+
+    async def stop_multi(self):
+        """Handle stop_multi: go back to single-source playback"""
+        if self.multi is None:
+            raise ValueError("Not in multi-source mode")
+        await self.stop_playback()
+        self.start_playback()
+
+    def source_session_id(self, source_id):
+        """Recorder key for one source of a multi-source session (fits PhasePrediction.session_id)"""
+        return f"{self.session_id[:16]}:{source_id}"[:32]
+
+    async def process_multi(self):
+        """Tick loop of multi-source mode: one batched inference over every source per tick"""
+        session = self.multi
+        video_time = 0.0
+        try:
+            await self.send_message({
+                'status': 'multi_started',
+                'sources': list(session.sources),
+                'tick_interval': session.tick_interval,
+                'timestamp': time.time()
+            })
+            while self.running:
+                if self.paused:
+                    await asyncio.sleep(0.5)
+                    continue
+                
+                tick_start = time.time()
+                frames = await session.collect(video_time)
+                if frames:
+                    await self.send_multi_results(frames, tick_start, video_time)
+                elif session.finished:
+                    await self.send_message({'status': 'multi_ended', 'timestamp': time.time()})
+                    break
+                
+                video_time += session.tick_interval * self.speed
+                await asyncio.sleep(max(0.0, session.tick_interval - (time.time() - tick_start)))
+        except asyncio.CancelledError:
+            logger.info("Multi-source task canceled")
+        except Exception as e:
+            logger.error(f"Error in process_multi: {e}", exc_info=True)
+            await self.send_message({
+                'error': str(e),
+                'timestamp': time.time()
+            })
+
+    @track_in_flight
+    async def send_multi_results(self, frames, tick_time, video_time):
+        """Classify one tick's frames as a batch and send every source's result in one message"""
+        session = self.multi
+        loop = asyncio.get_running_loop()
+        source_ids = list(frames)
+        batch = [frames[source_id][0] for source_id in source_ids]
+        
+        inference_time = 0
+        degraded = not self.scheduler.admit(self.session_id, cost=len(batch))
+        if not degraded:
+            start_time = time.time()
+            indices, scores = await loop.run_in_executor(None, session.classify, batch)
+            inference_time = time.time() - start_time
+            self.metrics.record_inference(inference_time)
+            for source_id, pred_index, row in zip(source_ids, indices, scores):
+                session.predictions[source_id] = (int(pred_index), row)
+                info = frames[source_id][1]
+                # Persist the raw top class even when it is below its display threshold
+                self.recorder.record(self.source_session_id(source_id), info.get('position', 0), int(np.argmax(row)), row)
+        
+        results = {}
+        for source_id in source_ids:
+            result = dict(frames[source_id][1])
+            if source_id in session.predictions:
+                result['stage'], result['confidences'] = to_display(*session.predictions[source_id], self.model.CLASSES)
+            results[source_id] = result
+            self.metrics.record_frame(f"{self.session_id}:{source_id}", queue_depth=self.flow.depth())
+        
+        # Runner-up phases for every predicted source, in one call over the batch
+        predicted = [source_id for source_id in source_ids if source_id in session.predictions]
+        if predicted and session.top_k:
+            top_indices, top_scores = top_k(np.stack([session.predictions[s][1] for s in predicted]), session.top_k)
+            for source_id, alternatives in zip(predicted, top_k_display(top_indices, top_scores, self.model.CLASSES)):
+                results[source_id]['top_k'] = alternatives
+        
+        # Server-side videos go back as JPEG (client-fed sources already have their frames).
+        # Like single-source frames, the tick goes through flow control and is only encoded if sent.
+        images = {source_id: frames[source_id][0] for source_id in source_ids if 'position' in frames[source_id][1]}
+        self.flow.offer(images, {
+            'multi': True,
+            'tick_time': tick_time,  # Reference time all sources are aligned to
+            'video_time': round(video_time, 3),
+            'sources': results,
+            'inference_time': round(inference_time * 1000, 2),  # One batched call for all sources
+            'degraded': degraded,
+            'timestamp': time.time()
+        })
+
+    async def send_multi_frame(self, images, message):
+        """Encode the video sources' frames of one multi-source tick and send the tick message"""
+        loop = asyncio.get_running_loop()
+        executor = get_encode_executor()
+        encoded = await asyncio.gather(*(
+            loop.run_in_executor(executor, encode_jpeg, frame, self.flow.quality)
+            for frame in images.values()
+        ))
+        for source_id, image in zip(images, encoded):
+            result = message['sources'][source_id]
+            result['image'] = image if self.serializer.binary else base64.b64encode(image).decode('ascii')
+        await self.send_message(message)
+
+    async def release_capture(self):
+        """Release the video capture once no worker thread is decoding from it"""
+        async with self.cap_lock:
             if self.cap and self.cap.isOpened():
                 try:
                     self.cap.release()
                     logger.info("Video resource released")
                 except Exception as e:
                     logger.error(f"Error releasing video capture: {e}")
-    
-    async def process_frame(self, frame):
-        """Process a video frame (either from backend or webcam) and send results to client"""
+
+    async def load_video_index(self, video_path):
+        """Load or build the keyframe index; seeks fall back to plain frame seeks until it is ready"""
+        try:
+            loop = asyncio.get_running_loop()
+            self.video_index = await loop.run_in_executor(None, get_index_store().get, video_path)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error indexing video: {e}")
+
+    async def read_frame(self, target, exact=True):
+        """
+        Decode frame `target` on a worker thread so seeks don't stall the event loop.
+        Returns (ret, frame, index actually decoded); inexact reads may land on a keyframe.
+        """
+        async with self.cap_lock:
+            if not self.cap or not self.cap.isOpened():
+                return False, None, target
+            keyframe = self.video_index.keyframe_before(target) if self.video_index else None
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.cap.read_at, target, exact, keyframe)
+
+    def cached_prediction(self, position):
+        """Nearest cached (class index, scores) within one stride of `position`"""
+        if self.timeline is None or self.inference_mode != 'standard':
+            return None  # The cache only holds standard-mode results
+        nearest = self.timeline.nearest(position)
+        if nearest is None or abs(nearest[0] - position) > self.FRAME_PROCESS_INTERVAL:
+            return None
+        return nearest[1:]
+
+    def video_time(self, position):
+        """Presentation time in seconds of a backend video frame"""
+        if self.video_index is not None:
+            return self.video_index.time_of(position)
+        return position / self.fps
+
+    async def show_frame_at(self, target, exact=False):
+        """Move backend playback to frame `target` and send that frame with its prediction"""
+        if self.webcam_mode or self.cap is None:
+            raise ValueError("Seeking is only available for backend video")
+        
+        # Stay on the processing grid so cached predictions line up after the jump
+        stride = self.FRAME_PROCESS_INTERVAL
+        target = max(0, int(round(target / stride)) * stride)
+        
+        ret, frame, position = await self.read_frame(target, exact)
+        if not ret:
+            raise ValueError(f"Frame {target} is beyond the end of the video")
+        
+        self.position = position
+        self.frame_count = position + stride
+        self.embeddings.clear()  # Clip context does not carry across a jump
+        if self.timeline_builder is not None:
+            self.timeline_builder.complete = False  # Playback is no longer one sequential pass
+        
+        await self.process_frame(frame, prediction=self.cached_prediction(position))
+
+    async def seek(self, data):
+        """Handle the seek command: {'time': seconds} or {'frame': index}, optional 'exact'"""
+        if 'frame' in data:
+            target = int(data['frame'])
+        else:
+            seconds = float(data.get('time', 0))
+            if self.video_index is not None:
+                target = self.video_index.frame_at(seconds)
+            else:
+                target = int(round(seconds * self.fps))
+        await self.show_frame_at(target, exact=bool(data.get('exact', False)))
+
+    async def step(self, data):
+        """Handle the step command: move `count` processed frames (negative steps back)"""
+        count = int(data.get('count', 1))
+        target = self.position + count * self.FRAME_PROCESS_INTERVAL
+        await self.show_frame_at(target, exact=True)
+
+    async def load_cached_timeline(self, video_path, fps):
+        """Attach cached predictions for this video, or start collecting them for the cache"""
+        if self.model.model_version is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            # Hashing a new recording reads the whole file, so keep it off the event loop
+            self.timeline_key = await loop.run_in_executor(
+                None, self.result_cache.make_key, video_path, self.model.model_version, self.FRAME_PROCESS_INTERVAL
+            )
+            self.timeline = await loop.run_in_executor(None, self.result_cache.load, self.timeline_key)
+        except Exception as e:
+            logger.error(f"Error loading cached timeline: {e}")
+            return
+        
+        if self.timeline is not None:
+            logger.info(f"Replaying {len(self.timeline)} cached predictions for {video_path}")
+        else:
+            self.timeline_builder = TimelineBuilder(fps, self.FRAME_PROCESS_INTERVAL)
+
+    def building_timeline(self):
+        """True while a sequential standard-mode pass is collecting predictions for the result cache"""
+        return (
+            self.timeline_builder is not None and self.timeline_builder.complete
+            and self.inference_mode == 'standard' and not self.webcam_mode
+        )
+
+    async def wait_for_budget(self):
+        """Wait until the scheduler admits this stream's next frame; False if playback stopped first"""
+        while self.running and not self.paused:
+            if self.scheduler.admit(self.session_id, degrade=False):
+                return True
+            await asyncio.sleep(1.0 / self.scheduler.stream_fps)
+        return False
+
+    async def store_timeline(self):
+        """Cache the predictions collected during a complete pass over the video"""
+        builder, self.timeline_builder = self.timeline_builder, None
+        if builder is None or not builder.is_complete():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.result_cache.store, self.timeline_key, builder.build())
+        except Exception as e:
+            logger.error(f"Error storing timeline: {e}")
+
+    async def frame_sender(self):
+        """Send the latest frame message whenever the client's window allows it"""
+        try:
+            while True:
+                seq, frame, message = await self.flow.take()
+                try:
+                    message['seq'] = seq  # Echoed back in frame_ack
+                    if message.get('multi'):
+                        await self.send_multi_frame(frame, message)
+                    elif self.transport_mode == 'fmp4' and not message['webcam_mode'] and 'position' in message:
+                        # Only backend playback has the frame positions and steady rate the stream is timed by
+                        await self.send_fmp4_frame(frame, message)
+                    else:
+                        # Encode only frames that actually go out, capped by the client's current level
+                        jpeg = await self.encoder.encode_async(frame, self.flow.quality, self.flow.scale)
+                        await self.send_message(message, image=jpeg)
+                    self.flow.on_sent(seq)
+                except Exception as e:
+                    logger.error(f"Error sending frame: {e}")
+                    self.flow.on_done(seq)
+        except asyncio.CancelledError:
+            pass
+
+    def message_rate(self):
+        """Frame messages per second during backend playback: one per loop iteration"""
+        return self.fps * self.speed
+
+    async def wait_fmp4_encode(self):
+        """Wait for an encode still running on the executor (cancelling its task doesn't stop the thread)"""
+        if self.fmp4_encoding is not None:
+            await asyncio.wait({self.fmp4_encoding})
+            self.fmp4_encoding = None
+
+    async def close_fmp4(self):
+        """Close the fMP4 encoder off the event loop, once no encode is using it"""
+        async with self.fmp4_lock:
+            await self.wait_fmp4_encode()
+            encoder, self.fmp4 = self.fmp4, None
+            if encoder is not None:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(get_encode_executor(), encoder.close)
+
+    async def send_fmp4_frame(self, frame, message):
+        """Send the prediction keyed by pts, then the frame's fMP4 fragment as a binary message"""
+        loop = asyncio.get_running_loop()
+        # The frame position is the pts, so frames skipped by flow control don't compress time
+        position = message['position']
+        async with self.fmp4_lock:
+            await self.wait_fmp4_encode()
+            if self.fmp4 is None or not self.fmp4.matches(frame, position):
+                # New stream (first frame, resolution change or seek back): the next chunk starts with an init segment
+                if self.fmp4 is not None:
+                    await loop.run_in_executor(get_encode_executor(), self.fmp4.close)
+                height, width = frame.shape[:2]
+                self.fmp4 = FragmentedMP4Encoder(
+                    width, height, fps=self.message_rate(), pts_per_frame=self.FRAME_PROCESS_INTERVAL
+                )
+                message['init_segment'] = True
+            self.fmp4_encoding = loop.run_in_executor(get_encode_executor(), self.fmp4.encode, frame, position)
+            # Shielded so a cancelled sender leaves the future for close_fmp4 to wait on
+            data, pts = await asyncio.shield(self.fmp4_encoding)
+            self.fmp4_encoding = None
+        message['pts'] = pts
+        message['transport'] = 'fmp4'
+        if self.serializer.binary:
+            # MessagePack carries the fragment in the same message as its prediction
+            message['segment'] = data
+            await self.send_message(message)
+            return
+        await self.send_message(message)
+        if data:
+            await self.send(bytes_data=data)
+
+    async def send_message(self, message, image=None):
+        """Serialise a message in the negotiated wire format and send it"""
+        data = self.serializer.dumps(message, image)
+        if self.serializer.binary:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
+
+    @track_in_flight
+    async def process_frame(self, frame, prediction=None, admitted=False):
+        """
+        Process a video frame (either from backend or webcam) and send results to client.
+        A precomputed (class index, scores) tuple skips model inference; `admitted`
+        means the scheduler has already granted this frame its model call.
+        """
         try:
             # Send system status information periodically (every 5 seconds)
             current_time = time.time()
@@ -220,11 +858,13 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                         'avg_inference_time': model_info['avg_inference_time'],
                         'paused': self.paused,  # Include pause state in status updates
                         'webcam_mode': self.webcam_mode,  # Include webcam mode state
+                        'inference_mode': self.inference_mode,
+                        'transport': {**self.flow.stats(), **self.encoder.stats()},  # Quality/scale adjustments for this client
                         'timestamp': time.time()
                     }
                     
                     # Send status update
-                    await self.send(text_data=json.dumps(status_message))
+                    await self.send_message(status_message)
                     self.last_status_update = current_time
                 except Exception as e:
                     logger.error(f"Error sending status update: {e}")
@@ -232,10 +872,10 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
             # Check if frame is valid before processing
             if frame is None or not isinstance(frame, np.ndarray):
                 logger.error("Invalid frame received from video source")
-                await self.send(text_data=json.dumps({
+                await self.send_message({
                     'error': "Invalid frame received from video source",
                     'timestamp': time.time()
-                }))
+                })
                 return
             
             # Get frame dimensions for validation
@@ -244,62 +884,96 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                 logger.error(f"Invalid frame dimensions: {width}x{height}")
                 return
                 
-            # Start time measurement for model inference
-            start_time = time.time()
+            if prediction is None and not admitted and not self.scheduler.admit(self.session_id):
+                # Over this stream's budget: degrade to the last prediction rather than queue inference
+                self.offer_degraded(frame)
+                return
             
-            # Run model prediction
-            pred_class, confidence_scores = self.model.predict(frame)
-            inference_time = time.time() - start_time
+            # Inference awaits, so a seek may move self.position before this frame is recorded
+            position = self.position
+            # Webcam predictions are numbered by uploaded frame; self.position is the paused backend video's
+            frame_index = self.client_frames if self.webcam_mode else position
+            
+            if prediction is None:
+                # Start time measurement for model inference
+                start_time = time.time()
+                
+                # Run model prediction on a worker thread; the model lock may be held by a broadcaster
+                loop = asyncio.get_running_loop()
+                pred_index, scores = await loop.run_in_executor(None, functools.partial(
+                    self.model.predict,
+                    frame, mode=self.inference_mode, embeddings=self.embeddings, threshold=self.cascade_threshold
+                ))
+                inference_time = time.time() - start_time
+                self.metrics.record_inference(inference_time)
+            else:
+                # Cached result from an earlier pass, no model cost
+                pred_index, scores = prediction
+                inference_time = 0
             
             # Store prediction in cache
             self.last_prediction = {
-                'class': pred_class,
-                'scores': confidence_scores,
+                'index': pred_index,
+                'scores': scores,
                 'time': time.time()
             }
             
-            # Prepare confidence scores for frontend
-            confidence_list = [confidence_scores.get(cls, 0) for cls in self.model.CLASSES]
+            # Queue the prediction for the batched database writer
+            self.recorder.record(self.session_id, frame_index, pred_index, scores)
+            if self.timeline_builder is not None and not self.webcam_mode:
+                if self.inference_mode == 'standard':
+                    self.timeline_builder.add(position, pred_index, scores)
+                else:
+                    self.timeline_builder.complete = False
             
-            # Encode frame as base64 for transmission
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])  # Quality 85% for better performance
-            img_str = base64.b64encode(buffer).decode('utf-8')
+            # Format the score vector for the frontend, once per message
+            stage, confidence_list = to_display(pred_index, scores, self.model.CLASSES)
             
             # Calculate elapsed time for video playback
             elapsed_time = time.time() - self.start_time
             
-            # Create the message with all required data
+            # Create the message with all required data; the sender adds the encoded image
             message = {
-                'image': img_str,
-                'stage': pred_class,
+                'stage': stage,
                 'confidences': confidence_list,
                 'inference_time': round(inference_time * 1000, 2),  # in milliseconds
                 'timestamp': time.time(),
                 'elapsed_time': round(elapsed_time, 2),  # seconds since start
+                'replayed': prediction is not None,  # Prediction served from the result cache
+                'position': position,  # Backend video frame index
+                'video_time': round(self.video_time(position), 2),  # Backend video time in seconds
                 'webcam_mode': self.webcam_mode  # Include webcam mode state
             }
+            if self.webcam_mode:
+                message['client_frame'] = self.client_frames  # Which uploaded frame this result is for
             
-            # Send to client
-            await self.send(text_data=json.dumps(message))
+            # Hand over to the sender, superseding any frame the client hasn't taken yet
+            self.flow.offer(frame, message)
+            self.metrics.record_frame(
+                self.session_id,
+                cache_hit=(prediction is not None) if self.timeline is not None and not self.webcam_mode else None,
+                queue_depth=self.flow.depth()
+            )
+            if prediction is None and self.inference_mode == 'standard':
+                # The client's result is already queued; the candidate model runs on its own thread.
+                # It scores single plain frames, so TTA/temporal/cascade results aren't comparable.
+                self.shadow.offer(frame, pred_index, scores, inference_time, self.session_id, frame_index)
         except Exception as e:
             logger.error(f"Error processing frame: {e}")
             # If prediction fails but we have a previous one, use it
             if self.last_prediction and time.time() - self.last_prediction['time'] < 5.0:
                 # Use cached prediction if available and recent
                 try:
-                    confidence_list = [self.last_prediction['scores'].get(cls, 0) for cls in self.model.CLASSES]
-                    
-                    # Encode frame as base64 for transmission
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                    img_str = base64.b64encode(buffer).decode('utf-8')
+                    stage, confidence_list = to_display(
+                        self.last_prediction['index'], self.last_prediction['scores'], self.model.CLASSES
+                    )
                     
                     # Calculate elapsed time for video playback
                     elapsed_time = time.time() - self.start_time
                     
                     # Create the message with cached prediction
                     message = {
-                        'image': img_str,
-                        'stage': self.last_prediction['class'],
+                        'stage': stage,
                         'confidences': confidence_list,
                         'inference_time': 0,  # No new inference
                         'timestamp': time.time(),
@@ -308,19 +982,39 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                         'webcam_mode': self.webcam_mode
                     }
                     
-                    await self.send(text_data=json.dumps(message))
+                    self.flow.offer(frame, message)
                 except Exception as inner_e:
                     logger.error(f"Error sending cached prediction: {inner_e}")
-                    await self.send(text_data=json.dumps({
+                    await self.send_message({
                         'error': str(inner_e),
                         'timestamp': time.time()
-                    }))
+                    })
             else:
                 # Send error to client
-                await self.send(text_data=json.dumps({
+                await self.send_message({
                     'error': str(e),
                     'timestamp': time.time()
-                }))
+                })
+
+    def offer_degraded(self, frame):
+        """Send a frame without running the model, labelled with the last prediction if any"""
+        message = {
+            'inference_time': 0,
+            'timestamp': time.time(),
+            'elapsed_time': round(time.time() - self.start_time, 2),
+            'degraded': True,  # Inference skipped by the scheduler
+            'position': self.position,
+            'video_time': round(self.video_time(self.position), 2),
+            'webcam_mode': self.webcam_mode
+        }
+        if self.webcam_mode:
+            message['client_frame'] = self.client_frames
+        if self.last_prediction:
+            message['stage'], message['confidences'] = to_display(
+                self.last_prediction['index'], self.last_prediction['scores'], self.model.CLASSES
+            )
+        self.flow.offer(frame, message)
+        self.metrics.record_frame(self.session_id, queue_depth=self.flow.depth())
 
     async def received_message(self, text_data):
         """Handle received messages from client"""
@@ -331,10 +1025,19 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
             if 'command' in data:
                 command = data['command']
                 
+                # Frame acknowledgements are flow control, not user commands, so no reply
+                if command == 'frame_ack':
+                    self.flow.on_ack(int(data.get('seq', 0)))
+                    return
+                
                 if command == 'pause':
                     # Implement pause logic
                     self.paused = True
                     logger.info("Video processing paused")
+                elif command == 'resume' and data.get('token'):
+                    # Continue a stream from an earlier connection
+                    await self.resume_session(data['token'])
+                    logger.info(f"Session resumed at frame {self.frame_count}")
                 elif command == 'resume':
                     # Implement resume logic
                     self.paused = False
@@ -343,34 +1046,103 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                     # Switch to webcam mode
                     self.webcam_mode = True
                     self.paused = True  # Pause backend video processing
+                    self.embeddings.clear()
+                    self.scheduler.set_priority(self.session_id, self.stream_priority())
                     logger.info("Switched to webcam mode")
                 elif command == 'switch_to_backend':
                     # Switch back to backend mode
                     self.webcam_mode = False
                     self.paused = False  # Resume backend video processing
+                    self.embeddings.clear()
+                    self.scheduler.set_priority(self.session_id, self.stream_priority())
                     logger.info("Switched to backend mode")
+                elif command == 'seek':
+                    await self.seek(data)
+                    logger.info(f"Seeked to frame {self.position}")
+                elif command == 'step':
+                    await self.step(data)
+                elif command == 'select_source':
+                    await self.select_source(data)
+                    logger.info(f"Switched to video source {self.source_id}")
+                elif command == 'set_inference_mode':
+                    mode = data.get('mode', 'standard')
+                    if mode not in self.model.INFERENCE_MODES:
+                        raise ValueError(f"Unknown inference mode: {mode}")
+                    self.inference_mode = mode
+                    if 'threshold' in data:
+                        # Per connection, so one client tuning throughput vs accuracy doesn't affect others
+                        self.cascade_threshold = min(max(float(data['threshold']), 0.0), 1.0)
+                    logger.info(f"Inference mode set to {mode}")
+                elif command == 'set_encoding':
+                    # Byte budget per frame, or a bitrate spread over the frame messages actually sent
+                    self.encoder.set_target(
+                        target_bytes=data.get('target_bytes'),
+                        bitrate=data.get('bitrate'),
+                        fps=self.message_rate(),
+                    )
+                    logger.info(f"JPEG target set to {self.encoder.target_bytes} bytes per frame")
+                elif command == 'set_transport':
+                    mode = data.get('mode', 'jpeg')
+                    if mode not in TRANSPORT_MODES:
+                        raise ValueError(f"Unknown transport: {mode}")
+                    if mode == 'fmp4' and not fmp4_available():
+                        raise ValueError("fmp4 transport needs PyAV installed on the server")
+                    # A client switching back to fmp4 needs a fresh init segment
+                    await self.close_fmp4()
+                    self.transport_mode = mode
+                    logger.info(f"Transport set to {mode}")
+                elif command == 'start_multi':
+                    await self.start_multi(data)
+                    logger.info(f"Multi-source mode with {len(self.multi.sources)} sources")
+                elif command == 'stop_multi':
+                    await self.stop_multi()
+                    logger.info("Multi-source mode stopped")
+                elif command == 'set_speed':
+                    self.speed = min(max(float(data.get('speed', 1.0)), self.MIN_SPEED), self.MAX_SPEED)
+                    if self.fmp4 is not None:
+                        await self.close_fmp4()  # The next frame starts a stream timed at the new rate
+                    logger.info(f"Playback speed set to {self.speed}x")
                 
                 # Acknowledge the command
-                await self.send(text_data=json.dumps({
+                await self.send_message({
                     'command_ack': command,
                     'status': 'success',
                     'paused': self.paused,
                     'webcam_mode': self.webcam_mode,
+                    'position': self.position,
+                    'speed': self.speed,
+                    'inference_mode': self.inference_mode,
+                    'transport_mode': self.transport_mode,
                     'timestamp': time.time()
-                }))
+                })
                 
         except Exception as e:
             logger.error(f"Error handling client message: {e}")
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'error': f"Failed to process message: {str(e)}",
                 'timestamp': time.time()
-            }))
+            })
 
     async def receive(self, text_data=None, bytes_data=None):
         """Handle incoming messages from WebSocket clients"""
+        if getattr(self, 'traffic', None) is not None:
+            self.traffic.record(text_data, bytes_data)
         try:
-            # Handle binary data (webcam frames)
             if bytes_data:
+                self.client_frames += 1  # Counts every upload, so clients can number frames the same way
+            
+            # Tagged frames for a client-fed source of a multi-source session
+            if bytes_data and self.multi is not None:
+                source_id, jpeg = parse_tagged_frame(bytes_data)
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    raise ValueError(f"Failed to decode frame for source {source_id}")
+                self.multi.push(source_id, frame)
+            
+            # Handle binary data (webcam frames)
+            elif bytes_data:
+                if not self.running:
+                    return  # Stopping or draining
                 if not self.webcam_mode:
                     logger.warning("Received bytes data but not in webcam mode, ignoring")
                     return
@@ -394,7 +1166,7 @@ class VideoStreamConsumer(AsyncWebsocketConsumer):
                 
         except Exception as e:
             logger.error(f"Error in receive method: {e}")
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'error': 'Server error processing your request',
                 'timestamp': time.time()
-            }))
\ No newline at end of file
+            })
\ No newline at end of file
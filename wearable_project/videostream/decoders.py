@@ -0,0 +1,269 @@
+# videostream/decoders.py
+import logging
+import threading
+import time
+
+import cv2
+from django.conf import settings
+
+try:
+    import av  # Optional: PyAV for threaded decoding with codec-level frame skipping
+except ImportError:
+    av = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _output_size(width, height, max_width):
+    """Frame size after the optional reduced-resolution decode (even, aspect preserved)"""
+    if not max_width or width <= max_width:
+        return width, height
+    scale = max_width / width
+    return int(max_width) & ~1, max(2, int(height * scale)) & ~1
+
+
+class OpenCVDecoder:
+    """
+    cv2.VideoCapture (FFmpeg backend) behind the decoder interface.
+
+    Also accepts a camera index. With `hw_accel` OpenCV may use any hardware
+    decoder it finds and silently falls back to software when there is none.
+    Reduced resolution is a resize after decoding.
+    """
+
+    name = 'opencv'
+    MAX_DECODE_AHEAD = 60  # Frames we will decode forward rather than seek
+
+    def __init__(self, source, max_width=None, hw_accel=False):
+        params = []
+        if hw_accel and hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+            params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        if isinstance(source, int):
+            self.cap = cv2.VideoCapture(source)
+        else:
+            self.cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG, params)
+        self.pos = 0  # Index of the next frame the capture will return
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else 30.0
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.size = _output_size(width, height, max_width)
+        self._resize = self.size != (width, height)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.size[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.size[1]
+        return self.cap.get(prop)
+
+    def read(self):
+        ret, frame = self.cap.read()
+        self.pos += 1
+        if ret and self._resize:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return ret, frame
+
+    def read_at(self, target, exact=True, keyframe=None):
+        """Blocking decode of frame `target`; returns (ret, frame, index actually decoded)"""
+        gap = target - self.pos
+        if 0 <= gap <= self.MAX_DECODE_AHEAD:
+            # Decoding forward is cheaper than a seek for short gaps
+            for _ in range(gap):
+                if not self.cap.grab():
+                    return False, None, target
+        else:
+            if keyframe is not None and not exact and target - keyframe > self.MAX_DECODE_AHEAD:
+                # Land on the keyframe so the seek needs no extra decoding
+                target = keyframe
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        self.pos = target
+        ret, frame = self.read()
+        return ret, frame, target
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVDecoder:
+    """
+    PyAV decoder with frame and slice threading.
+
+    While decoding forward to a target more than SKIP_MARGIN frames away the
+    codec is told to skip non-reference frames entirely (nothing depends on
+    them), and frames that aren't returned are never converted to BGR.
+    Reduced resolution happens inside the colour conversion. Frame indices
+    come from presentation timestamps, like VideoIndex.
+    """
+
+    name = 'pyav'
+    MAX_DECODE_AHEAD = 120  # Forward decoding is cheap with skipping, so seek less eagerly
+    SKIP_MARGIN = 8  # Frames before the target decoded normally (covers B-frame reordering)
+
+    def __init__(self, path, max_width=None, threads=0):
+        if av is None:
+            raise RuntimeError("PyAV is not installed")
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.codec_context.thread_type = 'AUTO'
+        self.stream.codec_context.thread_count = threads  # 0 lets FFmpeg pick one per core
+        self.fps = float(self.stream.average_rate or 0) or 30.0
+        self.time_base = self.stream.time_base
+        self.start_pts = self.stream.start_time or 0
+        self.size = _output_size(self.stream.codec_context.width, self.stream.codec_context.height, max_width)
+        self.pos = 0
+        self._frames = self.container.decode(self.stream)
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.stream.frames
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.size[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.size[1]
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.pos
+        return 0
+
+    def _next(self):
+        try:
+            frame = next(self._frames)
+        except (StopIteration, av.error.EOFError):
+            return None
+        if frame.pts is not None:
+            self.pos = int(round(float((frame.pts - self.start_pts) * self.time_base) * self.fps)) + 1
+        else:
+            self.pos += 1
+        return frame
+
+    def _to_bgr(self, frame):
+        return frame.to_ndarray(width=self.size[0], height=self.size[1], format='bgr24')
+
+    def _set_skip(self, skip):
+        self.stream.codec_context.skip_frame = 'NONREF' if skip else 'DEFAULT'
+
+    def read(self):
+        frame = self._next()
+        if frame is None:
+            return False, None
+        return True, self._to_bgr(frame)
+
+    def read_at(self, target, exact=True, keyframe=None):
+        """Blocking decode of frame `target`; returns (ret, frame, index actually decoded)"""
+        seeked = False
+        if target < self.pos or target - self.pos > self.MAX_DECODE_AHEAD:
+            # Seeks land on the keyframe at or before the target
+            timestamp = self.start_pts + int(target / self.fps / self.time_base)
+            self.container.seek(timestamp, stream=self.stream, backward=True, any_frame=False)
+            self._frames = self.container.decode(self.stream)
+            self.pos = 0  # Unknown until the first frame comes out
+            seeked = True
+
+        skipping = False
+        try:
+            while True:
+                skip = not (seeked and not exact) and target - self.pos > self.SKIP_MARGIN
+                if skip != skipping:
+                    self._set_skip(skip)
+                    skipping = skip
+                frame = self._next()
+                if frame is None:
+                    return False, None, target
+                index = self.pos - 1
+                if index >= target or (seeked and not exact):
+                    # Overshooting only happens when the target itself was skipped or missing
+                    return True, self._to_bgr(frame), index
+        finally:
+            if skipping:
+                self._set_skip(False)
+
+    def release(self):
+        if self._opened:
+            self._opened = False
+            self.container.close()
+
+
+DECODERS = {'opencv': OpenCVDecoder}
+if av is not None:
+    DECODERS['pyav'] = PyAVDecoder
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _decoder_options(name):
+    max_width = getattr(settings, 'VIDEO_DECODE_MAX_WIDTH', None)
+    if name == 'pyav':
+        return {'max_width': max_width, 'threads': getattr(settings, 'VIDEO_DECODE_THREADS', 0)}
+    return {'max_width': max_width, 'hw_accel': getattr(settings, 'VIDEO_DECODE_HW_ACCEL', False)}
+
+
+def probe_decoders(video_path, frames=30, stride=10):
+    """Time each available backend reading every `stride`-th frame; returns {name: frames/s}"""
+    results = {}
+    for name, cls in DECODERS.items():
+        decoder = None
+        try:
+            decoder = cls(video_path, **_decoder_options(name))
+            start = time.perf_counter()
+            read = 0
+            for i in range(frames):
+                ret, _, _ = decoder.read_at(i * stride)
+                if not ret:
+                    break
+                read += 1
+            elapsed = time.perf_counter() - start
+            if read:
+                results[name] = read / elapsed
+        except Exception as e:
+            logger.warning(f"Decoder {name} failed the probe: {e}")
+        finally:
+            if decoder is not None:
+                decoder.release()
+    return results
+
+
+def get_decoder_backend(sample_path=None):
+    """
+    The configured backend (VIDEO_DECODER), or with 'auto' the fastest one on
+    `sample_path`, probed once per process.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            choice = getattr(settings, 'VIDEO_DECODER', 'auto')
+            if choice in DECODERS:
+                _backend = choice
+            elif choice == 'auto' and sample_path and len(DECODERS) > 1:
+                results = probe_decoders(sample_path)
+                _backend = max(results, key=results.get) if results else 'opencv'
+                logger.info(f"Decoder probe: {', '.join(f'{n} {fps:.0f} fps' for n, fps in results.items())}; using {_backend}")
+            else:
+                if choice != 'auto':
+                    logger.warning(f"Decoder {choice} is not available, using OpenCV")
+                _backend = 'opencv'
+        return _backend
+
+
+def open_video(source):
+    """Open a video file (or camera index) with the selected decoder backend"""
+    if isinstance(source, int):
+        return OpenCVDecoder(source)
+    name = get_decoder_backend(source)
+    try:
+        return DECODERS[name](source, **_decoder_options(name))
+    except Exception as e:
+        if name == 'opencv':
+            raise
+        logger.warning(f"{name} could not open {source}, falling back to OpenCV: {e}")
+        return OpenCVDecoder(source, **_decoder_options('opencv'))
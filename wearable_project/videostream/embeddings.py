@@ -0,0 +1,63 @@
+# videostream/embeddings.py
+import numpy as np
+
+
+class EmbeddingRingBuffer:
+    """
+    Fixed-size ring buffer of the most recent backbone embeddings for one stream.
+
+    Stored as float16 in a single preallocated array, so a 16 x 2048 window
+    costs 64 KB per connection and appending never allocates.
+    """
+
+    def __init__(self, capacity, dim, dtype=np.float16):
+        self.capacity = capacity
+        self.dim = dim
+        self._data = np.zeros((capacity, dim), dtype=dtype)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, embedding):
+        self._data[self._next] = embedding
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def window(self, k=None):
+        """Last `k` (default all) embeddings, oldest first, as float32"""
+        k = self._size if k is None else min(k, self._size)
+        if k == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        idx = (self._next - k + np.arange(k)) % self.capacity
+        return self._data[idx].astype(np.float32)
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+
+class TemporalHead:
+    """
+    Clip-level classifier over the last K embeddings.
+
+    Embeddings are pooled with exponentially decaying weights (newest weighs
+    most) and fed through the frame classifier's own linear layer. Because that
+    layer is linear this equals a weighted vote of per-frame logits, but costs
+    one matrix-vector product regardless of K.
+    """
+
+    def __init__(self, weight, bias, decay=0.8):
+        self.weight = np.asarray(weight, dtype=np.float32)  # (num_classes, dim)
+        self.bias = np.asarray(bias, dtype=np.float32)  # (num_classes,)
+        self.decay = decay
+
+    def __call__(self, window):
+        """Class probabilities for a (k, dim) window, oldest first"""
+        weights = self.decay ** np.arange(len(window) - 1, -1, -1, dtype=np.float32)
+        pooled = weights @ window / weights.sum()
+        logits = self.weight @ pooled + self.bias
+        logits -= logits.max()
+        probs = np.exp(logits)
+        return probs / probs.sum()
@@ -0,0 +1,135 @@
+# videostream/encoding.py
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420  # Optional: PyTurboJPEG binding to libjpeg-turbo
+except ImportError:
+    TurboJPEG = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+_turbo = None
+_executor = None
+
+
+def get_turbo():
+    """Shared TurboJPEG handle, or None when the binding or library is missing"""
+    global _turbo
+    if _turbo is None and TurboJPEG is not None and getattr(settings, 'JPEG_USE_TURBO', True):
+        try:
+            _turbo = TurboJPEG()
+        except Exception as e:
+            logger.warning(f"libjpeg-turbo unavailable, using OpenCV encoder: {e}")
+            _turbo = False
+    return _turbo or None
+
+
+def get_encode_executor():
+    """Thread pool shared by all connections; cv2 and libjpeg-turbo release the GIL while encoding"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'JPEG_ENCODER_THREADS', 4), thread_name_prefix='jpeg-encode'
+        )
+    return _executor
+
+
+def encode_jpeg(frame, quality, turbo=None):
+    """Encode a BGR frame to JPEG bytes with libjpeg-turbo when given, otherwise OpenCV"""
+    if turbo is not None:
+        return turbo.encode(frame, quality=quality, jpeg_subsample=TJSAMP_420)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+class FrameEncoder:
+    """
+    Per-connection JPEG encoder that steers quality and scale towards a byte
+    budget per frame.
+
+    After each frame the encoded size is compared with the target: quality
+    moves first, and only when it hits its bounds does the scale change. The
+    caller may cap quality and scale further (e.g. FrameFlowControl's level for
+    a lagging client). The downscale buffer is reused between frames of the
+    same size.
+    """
+
+    QUALITY_STEP = 5
+    SCALE_STEP = 0.85
+
+    def __init__(self, target_bytes=None, quality=85, min_quality=35, max_quality=90, min_scale=0.25):
+        self.target_bytes = target_bytes
+        self.quality = quality
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self.last_size = 0
+        self.avg_size = 0.0
+        self._resize_buffer = None
+        self._turbo = get_turbo()
+
+    def set_target(self, target_bytes=None, bitrate=None, fps=None):
+        """Budget per frame in bytes, or derived from a bitrate (bits/s) at `fps` frames/s"""
+        if bitrate and fps:
+            target_bytes = int(bitrate / 8 / fps)
+        self.target_bytes = target_bytes or None
+        if self.target_bytes is None:
+            self.scale = 1.0
+
+    def _resize(self, frame, scale):
+        height, width = frame.shape[:2]
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        buffer = self._resize_buffer
+        if buffer is None or buffer.shape[1::-1] != size:
+            buffer = self._resize_buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        return cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+
+    def encode(self, frame, quality_cap=100, scale_cap=1.0):
+        """Encode one frame (blocking) and adapt settings for the next one"""
+        quality = min(self.quality, quality_cap)
+        scale = min(self.scale, scale_cap)
+        if scale < 1.0:
+            frame = self._resize(frame, scale)
+        data = encode_jpeg(frame, quality, self._turbo)
+
+        self.last_size = len(data)
+        self.avg_size = self.last_size if not self.avg_size else 0.9 * self.avg_size + 0.1 * self.last_size
+        if self.target_bytes:
+            self._adapt()
+        return data
+
+    async def encode_async(self, frame, quality_cap=100, scale_cap=1.0):
+        """Encode on the shared thread pool so the event loop keeps serving other clients"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_encode_executor(), self.encode, frame, quality_cap, scale_cap)
+
+    def _adapt(self):
+        if self.last_size > self.target_bytes * 1.1:
+            if self.quality > self.min_quality:
+                self.quality = max(self.quality - self.QUALITY_STEP, self.min_quality)
+            else:
+                self.scale = max(self.scale * self.SCALE_STEP, self.min_scale)
+        elif self.last_size < self.target_bytes * 0.7:
+            if self.scale < 1.0:
+                self.scale = min(self.scale / self.SCALE_STEP, 1.0)
+            elif self.quality < self.max_quality:
+                self.quality = min(self.quality + self.QUALITY_STEP, self.max_quality)
+
+    def stats(self):
+        return {
+            'encoder': 'turbojpeg' if self._turbo else 'opencv',
+            'target_bytes': self.target_bytes,
+            'encode_quality': self.quality,
+            'encode_scale': round(self.scale, 3),
+            'avg_bytes': int(self.avg_size),
+        }
@@ -0,0 +1,138 @@
+# videostream/lifecycle.py
+import asyncio
+import functools
+import logging
+import os
+import signal
+import threading
+
+from django.conf import settings
+
+from .broadcast import broadcasters
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class LifecycleManager:
+    """
+    Tracks open stream consumers and drains them when the server is told to stop.
+
+    On SIGTERM (or SIGINT) the manager stops admitting streams, stops every
+    consumer's playback loop, waits up to `drain_timeout` seconds for in-flight
+    frames to finish, tells each client to reconnect (close code 1012, "service
+    restart") and releases all decoders. The signal handler that was installed
+    before ours (Daphne's) then runs, so the server still stops as usual. A
+    second signal skips the drain.
+    """
+
+    SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+    def __init__(self, drain_timeout=10.0, retry_after=5.0):
+        self.drain_timeout = drain_timeout
+        self.retry_after = retry_after
+        self.consumers = set()
+        self.draining = False
+        self.in_flight = 0
+        self._idle = None
+        self._loop = None
+        self._previous_handlers = {}
+
+    def install(self):
+        """Hook the stop signals; called from the event loop (main thread) on first connect"""
+        if self._loop is not None or threading.current_thread() is not threading.main_thread():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        for signum in self.SIGNALS:
+            self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+
+    def admit(self, consumer):
+        """Register a new consumer; False once draining has started"""
+        if self.draining:
+            return False
+        self.consumers.add(consumer)
+        return True
+
+    def remove(self, consumer):
+        self.consumers.discard(consumer)
+
+    def frame_started(self):
+        self.in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+
+    def frame_finished(self):
+        self.in_flight -= 1
+        if self.in_flight <= 0 and self._idle is not None:
+            self._idle.set()
+
+    def _on_signal(self, signum, frame):
+        if self.draining:
+            logger.warning("Second stop signal, shutting down without draining")
+            self._chain(signum, frame)
+            return
+        logger.info(f"Received signal {signum}, draining {len(self.consumers)} streams")
+        self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self.shutdown(signum, frame)))
+
+    async def shutdown(self, signum=None, frame=None):
+        """Drain every stream, then hand the signal on to the server"""
+        self.draining = True
+        try:
+            consumers = list(self.consumers)
+            # Stop the playback loops first so no new frames start
+            for consumer in consumers:
+                consumer.stop_accepting()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self.in_flight} frames still in flight after {self.drain_timeout}s")
+            await asyncio.gather(
+                *(consumer.drain(self.retry_after) for consumer in consumers), return_exceptions=True
+            )
+
+            # Shared HTTP broadcasters hold decoders too
+            for broadcaster in broadcasters.values():
+                broadcaster.stop()
+            logger.info("Drain complete")
+        except Exception as e:
+            logger.error(f"Error draining streams: {e}", exc_info=True)
+        finally:
+            if signum is not None:
+                self._chain(signum, frame)
+
+    def _chain(self, signum, frame):
+        previous = self._previous_handlers.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+
+def track_in_flight(method):
+    """Count calls of an async consumer method as in-flight work the drain waits for"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        lifecycle = get_lifecycle()
+        lifecycle.frame_started()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            lifecycle.frame_finished()
+    return wrapper
+
+
+# Singleton instance
+_lifecycle = None
+
+def get_lifecycle():
+    """Get or create the process-wide lifecycle manager"""
+    global _lifecycle
+    if _lifecycle is None:
+        _lifecycle = LifecycleManager(
+            drain_timeout=getattr(settings, 'SHUTDOWN_DRAIN_TIMEOUT', 10.0),
+            retry_after=getattr(settings, 'SHUTDOWN_RETRY_AFTER', 5.0),
+        )
+    return _lifecycle
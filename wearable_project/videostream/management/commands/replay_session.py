@@ -0,0 +1,276 @@
+"""
+Replay a recorded client session (see SESSION_RECORD_DIR) against
+VideoStreamConsumer, measure end-to-end latency and compare the predictions
+with a baseline from an earlier run. Exits non-zero on a regression.
+
+    python wearable_project/manage.py replay_session cache/sessions/<id>.wprs --lockstep --write-baseline base.json
+    python wearable_project/manage.py replay_session cache/sessions/<id>.wprs --lockstep --baseline base.json
+
+Without a recording it checks the regression suite: every <name>.wprs in
+SESSION_REPLAY_SUITE (or --suite) against its <name>.json baseline. This is
+what `pdm run regression` runs.
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from videostream.consumers import VideoStreamConsumer
+from videostream.model_interface import get_classifier
+from videostream.replay import read_recording
+from videostream.scheduler import get_scheduler
+
+
+class Command(BaseCommand):
+    help = "Replay a recorded WebSocket session and check latency and predictions against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('recording', nargs='*', help='.wprs files written by the consumer')
+        parser.add_argument('--suite', default=getattr(settings, 'SESSION_REPLAY_SUITE', None),
+                            help='Directory of <name>.wprs recordings with <name>.json baselines, '
+                                 'checked when no recording is given')
+        parser.add_argument('--speed', type=float, default=1.0, help='Multiplier on the recorded message timing')
+        parser.add_argument('--lockstep', action='store_true',
+                            help='Send each webcam frame as soon as the previous one has its result, ignoring '
+                                 'recorded timing. The stream is exempt from the inference scheduler so every '
+                                 'frame is classified, and the run fails if any frame is degraded')
+        parser.add_argument('--path', default='/ws/stream/')
+        parser.add_argument('--settle', type=float, default=2.0, help='Seconds to keep collecting results at the end')
+        parser.add_argument('--frame-timeout', type=float, default=10.0, help='Lockstep wait for one frame (s)')
+        parser.add_argument('--baseline', help='Baseline JSON to compare against')
+        parser.add_argument('--write-baseline', help='Write this run as a baseline JSON')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed confidence difference (points)')
+        parser.add_argument('--max-mismatches', type=int, default=0)
+        parser.add_argument('--latency-regression', type=float, default=0.2,
+                            help='Allowed p95 latency increase over the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if options['speed'] <= 0:
+            raise CommandError("--speed must be positive")
+        recordings = options['recording']
+        if recordings:
+            if len(recordings) > 1 and (options['baseline'] or options['write_baseline']):
+                raise CommandError("--baseline and --write-baseline take a single recording")
+            baselines = {recording: options['baseline'] for recording in recordings}
+        else:
+            if not options['suite']:
+                raise CommandError("Give a recording, or a --suite directory (SESSION_REPLAY_SUITE)")
+            recordings = sorted(str(path) for path in Path(options['suite']).glob('*.wprs'))
+            if not recordings:
+                raise CommandError(f"No recordings in {options['suite']}")
+            baselines = {recording: str(Path(recording).with_suffix('.json')) for recording in recordings}
+
+        failures = []
+        for recording in recordings:
+            failures += [f"{recording}: {failure}" for failure in self.check(recording, baselines[recording], options)]
+        if failures:
+            raise CommandError("Regression: " + "; ".join(failures))
+        if any(baselines.values()):
+            self.stdout.write(self.style.SUCCESS(f"No regression in {len(recordings)} recording(s)"))
+
+    def check(self, recording, baseline, options):
+        """Replay one recording; returns failure messages"""
+        try:
+            meta, events = read_recording(recording)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        frames = sum(isinstance(payload, bytes) for _, payload in events)
+        self.stdout.write(f"Replaying {len(events)} messages ({frames} frames) from session {meta.get('session_id')}")
+
+        # Don't record the replay itself
+        with override_settings(SESSION_RECORD_DIR=None):
+            run = asyncio.run(self.replay(meta, events, options))
+        run['recording'] = recording
+        self.report(run)
+
+        failures = []
+        if options['lockstep'] and run['degraded']:
+            failures.append(f"{run['degraded']} results degraded; lockstep replays must classify every frame")
+        if baseline:
+            try:
+                with open(baseline) as f:
+                    failures += self.compare(json.load(f), run, options)
+            except FileNotFoundError:
+                failures.append(f"no baseline at {baseline} (create it with --write-baseline)")
+        if options['write_baseline']:
+            with open(options['write_baseline'], 'w') as f:
+                json.dump(run, f, indent=1)
+            self.stdout.write(f"Baseline written to {options['write_baseline']}")
+        return failures
+
+    async def replay(self, meta, events, options):
+        loop = asyncio.get_running_loop()
+        # Load the model up front so it doesn't count as latency of the first frame
+        model = await loop.run_in_executor(None, get_classifier)
+
+        query = meta.get('query_string')
+        communicator = WebsocketCommunicator(
+            VideoStreamConsumer.as_asgi(), options['path'] + (f"?{query}" if query else '')
+        )
+        connected, _ = await communicator.connect(timeout=30)
+        if not connected:
+            raise CommandError("The consumer refused the connection")
+
+        ready = asyncio.Event()
+        session = {}  # The replayed stream's session_id, from its 'connected' status
+        results = {}  # Result key -> {'stage', 'confidences'}
+        sent_at = {}  # client_frame -> send time
+        waiters = {}  # client_frame -> future, in lockstep mode
+        latencies = []
+        counts = {'frames_answered': 0, 'messages': 0, 'results': 0, 'degraded': 0, 'errors': 0}
+
+        async def receive():
+            # receive_output cancels the consumer when it times out, so wait on it without a real timeout
+            while True:
+                output = await communicator.receive_output(timeout=24 * 3600)
+                if output['type'] == 'websocket.close':
+                    return
+                if output.get('text') is None:
+                    continue  # fMP4 fragments
+                message = json.loads(output['text'])
+                counts['messages'] += 1
+                if message.get('status') == 'connected':
+                    session['id'] = message.get('session_id')
+                    ready.set()
+                if 'seq' in message:
+                    await communicator.send_to(text_data=json.dumps({'command': 'frame_ack', 'seq': message['seq']}))
+                if 'error' in message:
+                    counts['errors'] += 1
+                for key, result in self.results_of(message):
+                    counts['results'] += 1
+                    if result.get('degraded'):
+                        counts['degraded'] += 1
+                    elif 'stage' in result:
+                        results[key] = {'stage': result['stage'], 'confidences': result['confidences']}
+                client_frame = message.get('client_frame')
+                if client_frame in sent_at:
+                    sent = sent_at.pop(client_frame)
+                    counts['frames_answered'] += 1
+                    if not message.get('degraded'):
+                        latencies.append(time.perf_counter() - sent)  # Degraded results skip the model
+                    waiter = waiters.pop(client_frame, None)
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(None)
+
+        receiver = asyncio.create_task(receive())
+        client_frames = 0
+        start = time.perf_counter()
+        try:
+            if options['lockstep']:
+                # Every frame must reach the model for the results to be comparable, so take the
+                # stream out of the scheduler (admit() doesn't limit unregistered streams)
+                try:
+                    await asyncio.wait_for(ready.wait(), 30)
+                except asyncio.TimeoutError:
+                    raise CommandError("The consumer did not report its session")
+                get_scheduler().unregister(session['id'])
+                start = time.perf_counter()
+            for offset, payload in events:
+                if not options['lockstep']:
+                    delay = start + offset / options['speed'] - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                if isinstance(payload, str):
+                    await communicator.send_to(text_data=payload)
+                    continue
+                client_frames += 1  # Numbered like the consumer's client_frame
+                sent_at[client_frames] = time.perf_counter()
+                if options['lockstep']:
+                    waiters[client_frames] = loop.create_future()
+                await communicator.send_to(bytes_data=payload)
+                if options['lockstep']:
+                    try:
+                        await asyncio.wait_for(waiters[client_frames], options['frame_timeout'])
+                    except asyncio.TimeoutError:
+                        waiters.pop(client_frames, None)
+            await asyncio.sleep(options['settle'])
+        finally:
+            elapsed = time.perf_counter() - start
+            receiver.cancel()
+            try:
+                await communicator.disconnect(timeout=5)
+            except Exception:
+                pass  # The consumer may already have closed (e.g. end of video)
+
+        latency = np.asarray(latencies) * 1000
+        return {
+            'model_version': model.model_version,
+            'lockstep': options['lockstep'],
+            'speed': options['speed'],
+            'elapsed': round(elapsed, 2),
+            'frames_sent': client_frames,
+            **counts,
+            'latency_ms': {
+                'mean': round(float(latency.mean()), 2) if len(latency) else None,
+                **{f'p{q}': round(float(np.percentile(latency, q)), 2) if len(latency) else None for q in (50, 95, 99)},
+            },
+            'results': results,
+        }
+
+    def results_of(self, message):
+        """(key, result) pairs in a consumer message; keys match the same frame across runs"""
+        if message.get('multi'):
+            # Client-fed sources have no frame position to match on
+            return [
+                (f"multi:{source_id}:{result['position']}", {**result, 'degraded': message.get('degraded')})
+                for source_id, result in message['sources'].items() if 'position' in result
+            ]
+        if 'confidences' not in message and not message.get('degraded'):
+            return []
+        if 'client_frame' in message:
+            return [(f"client:{message['client_frame']}", message)]
+        if 'position' in message:
+            return [(f"video:{message['position']}", message)]
+        return []
+
+    def report(self, run):
+        latency = run['latency_ms']
+        self.stdout.write(
+            f"{run['frames_answered']}/{run['frames_sent']} frames answered, {run['results']} results "
+            f"({run['degraded']} degraded), {run['errors']} errors in {run['elapsed']} s"
+        )
+        self.stdout.write(
+            f"End-to-end latency ms: mean {latency['mean']}, p50 {latency['p50']}, "
+            f"p95 {latency['p95']}, p99 {latency['p99']}"
+        )
+
+    def compare(self, baseline, run, options):
+        """Failure messages for prediction mismatches and latency regressions"""
+        failures = []
+        if baseline.get('model_version') != run['model_version']:
+            self.stdout.write(self.style.WARNING(
+                f"Model changed ({baseline.get('model_version')} -> {run['model_version']}), predictions may differ"
+            ))
+
+        expected, actual = baseline['results'], run['results']
+        common = sorted(set(expected) & set(actual))
+        mismatches = []
+        for key in common:
+            a, b = expected[key], actual[key]
+            drift = max((abs(x - y) for x, y in zip(a['confidences'], b['confidences'])), default=0)
+            if a['stage'] != b['stage'] or drift > options['tolerance']:
+                mismatches.append(f"{key}: {a['stage']} -> {b['stage']} (max drift {drift:.2f})")
+        self.stdout.write(
+            f"{len(common)} results compared, {len(mismatches)} mismatches, "
+            f"{len(set(expected) - set(actual))} baseline results missing"
+        )
+        for line in mismatches[:20]:
+            self.stdout.write(f"  {line}")
+        if expected and not common:
+            failures.append("no results in common with the baseline")
+        if len(mismatches) > options['max_mismatches']:
+            failures.append(f"{len(mismatches)} predictions differ from the baseline")
+
+        before, after = baseline['latency_ms'].get('p95'), run['latency_ms']['p95']
+        if before and after:
+            change = after / before - 1
+            self.stdout.write(f"p95 latency {before} -> {after} ms ({change * 100:+.1f}%)")
+            if change > options['latency_regression']:
+                failures.append(f"p95 latency up {change * 100:.1f}% ({before} -> {after} ms)")
+        return failures
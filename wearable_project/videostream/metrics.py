@@ -0,0 +1,167 @@
+# videostream/metrics.py
+import bisect
+import math
+import threading
+import time
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """
+    Rolling-window latency histogram with fixed memory.
+
+    Latencies fall into log-spaced buckets (about 10% wide, 0.5 ms to 30 s),
+    counted per one-second slot in a ring of `window` slots. Percentiles are
+    read from the summed slots, so they are accurate to a bucket width and
+    cost the same however many frames were recorded.
+    """
+
+    MIN_LATENCY = 0.0005
+    MAX_LATENCY = 30.0
+    GROWTH = 1.1
+
+    def __init__(self, window=60):
+        self.window = window
+        count = int(math.ceil(math.log(self.MAX_LATENCY / self.MIN_LATENCY, self.GROWTH))) + 1
+        self.edges = [self.MIN_LATENCY * self.GROWTH ** i for i in range(count)]
+        self.counts = np.zeros((window, count + 1), dtype=np.int64)  # Last bucket: overflow
+        self.slot_seconds = np.full(window, -1, dtype=np.int64)
+
+    def _slot(self, second):
+        slot = second % self.window
+        if self.slot_seconds[slot] != second:
+            self.counts[slot] = 0
+            self.slot_seconds[slot] = second
+        return slot
+
+    def add(self, seconds, now=None):
+        second = int(now if now is not None else time.time())
+        self.counts[self._slot(second), bisect.bisect_left(self.edges, seconds)] += 1
+
+    def totals(self, now=None):
+        """Bucket counts summed over the slots still inside the window"""
+        second = int(now if now is not None else time.time())
+        live = self.slot_seconds > second - self.window
+        return self.counts[live].sum(axis=0)
+
+    def percentiles(self, qs=(50, 95, 99), now=None):
+        """Latency (seconds, bucket upper edge) at each percentile; None when empty"""
+        totals = self.totals(now)
+        n = int(totals.sum())
+        if n == 0:
+            return {q: None for q in qs}
+        cumulative = np.cumsum(totals)
+        result = {}
+        for q in qs:
+            bucket = int(np.searchsorted(cumulative, n * q / 100.0))
+            result[q] = self.edges[min(bucket, len(self.edges) - 1)]
+        return result
+
+
+class RateCounter:
+    """Events per second over a rolling window of one-second slots"""
+
+    def __init__(self, window=5):
+        self.window = window
+        self.counts = [0] * window
+        self.slot_seconds = [-1] * window
+
+    def add(self, n=1, now=None):
+        second = int(now if now is not None else time.time())
+        slot = second % self.window
+        if self.slot_seconds[slot] != second:
+            self.counts[slot] = 0
+            self.slot_seconds[slot] = second
+        self.counts[slot] += n
+
+    def total(self, now=None):
+        second = int(now if now is not None else time.time())
+        # The current second is still filling, so only count completed ones
+        return sum(c for c, s in zip(self.counts, self.slot_seconds) if second - self.window <= s < second)
+
+    def rate(self, now=None):
+        return self.total(now) / self.window
+
+
+class MetricsAggregator:
+    """
+    In-process aggregator for the live stats feed.
+
+    Streams report inference latency, delivered frames, result-cache hits and
+    outbound queue depth; snapshot() condenses the rolling windows into the
+    numbers the stats page shows. Memory is fixed apart from one small rate
+    counter per active stream.
+    """
+
+    WINDOW = 60  # Seconds covered by the latency percentiles
+    RATE_WINDOW = 5  # Seconds averaged for throughput and FPS
+
+    def __init__(self):
+        self.latency = LatencyHistogram(self.WINDOW)
+        self.throughput = RateCounter(self.RATE_WINDOW)
+        self.cache_hits = RateCounter(self.WINDOW)
+        self.cache_misses = RateCounter(self.WINDOW)
+        self.streams = {}  # stream_id -> {'fps': RateCounter, 'queue_depth': int}
+        self._lock = threading.Lock()
+
+    def _stream(self, stream_id):
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            stream = self.streams[stream_id] = {'fps': RateCounter(self.RATE_WINDOW), 'queue_depth': 0}
+        return stream
+
+    def record_inference(self, seconds):
+        with self._lock:
+            self.latency.add(seconds)
+            self.throughput.add()
+
+    def record_frame(self, stream_id, cache_hit=None, queue_depth=None):
+        """A frame delivered by `stream_id`; cache_hit is None when the result cache wasn't consulted"""
+        with self._lock:
+            stream = self._stream(stream_id)
+            stream['fps'].add()
+            if queue_depth is not None:
+                stream['queue_depth'] = queue_depth
+            if cache_hit is True:
+                self.cache_hits.add()
+            elif cache_hit is False:
+                self.cache_misses.add()
+
+    def remove_stream(self, stream_id):
+        with self._lock:
+            self.streams.pop(stream_id, None)
+
+    def snapshot(self):
+        """Current rolling-window metrics as a JSON-serialisable dict"""
+        with self._lock:
+            now = time.time()
+            percentiles = self.latency.percentiles(now=now)
+            hits = self.cache_hits.total(now)
+            lookups = hits + self.cache_misses.total(now)
+            streams = {
+                stream_id: {'fps': round(s['fps'].rate(now), 2), 'queue_depth': s['queue_depth']}
+                for stream_id, s in self.streams.items()
+            }
+            return {
+                'latency_ms': {
+                    f"p{q}": round(value * 1000, 1) if value is not None else None
+                    for q, value in percentiles.items()
+                },
+                'throughput': round(self.throughput.rate(now), 2),
+                'streams': streams,
+                'queue_depth': sum(s['queue_depth'] for s in streams.values()),
+                'cache_hit_rate': round(hits / lookups * 100, 1) if lookups else None,
+                'timestamp': now,
+            }
+
+
+# Singleton instance
+_metrics = None
+
+def get_metrics():
+    """Get or create the process-wide metrics aggregator"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsAggregator()
+    return _metrics
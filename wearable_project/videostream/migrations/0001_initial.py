@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name='PhasePrediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=32)),
+                ('timestamp', models.FloatField()),
+                ('frame_index', models.IntegerField()),
+                ('phase', models.PositiveSmallIntegerField()),
+                ('confidence', models.FloatField()),
+                ('scores', models.BinaryField()),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['session_id', 'timestamp'], name='phasepred_session_ts_idx'),
+                    models.Index(fields=['timestamp'], name='phasepred_ts_idx'),
+                ],
+            },
+        ),
+    ]
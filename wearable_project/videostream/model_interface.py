@@ -6,9 +6,13 @@ import cv2
 from PIL import Image
 import torch
 import logging
+import threading
 import time
 from functools import lru_cache, wraps
 import hashlib
+from .embeddings import TemporalHead
+from .profiler import get_torch_capture
+from .scores import NO_PREDICTION, thresholded_argmax
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -87,6 +91,14 @@ def np_cache(maxsize=32):
         return wrapper
     return decorator
 
+def file_digest(path, chunk_size=1 << 20):
+    """Return the sha256 hex digest of a file, reading it in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 class SurgicalPhaseClassifier:
     """Interface for the surgical phase classification model"""
     
@@ -99,6 +111,16 @@ class SurgicalPhaseClassifier:
         'submucosal_injection'
     ]
     
+    # Selectable per connection; 'tta' scores several crops/flips in one batch,
+    # 'temporal' classifies the clip formed by the stream's last few embeddings,
+    # 'cascade' tries the small student model first and escalates unsure frames
+    INFERENCE_MODES = ('standard', 'tta', 'temporal', 'cascade')
+    TTA_CROP_RATIO = 0.875  # Side of each TTA crop relative to the frame
+    EMBEDDING_DIM = 2048  # GlobalAveragePooling output of the ResNet-50 backbone
+    TEMPORAL_DECAY = 0.8  # Weight ratio between consecutive embeddings in the temporal head
+    STUDENT_CONFIG = MODEL_DIR / 'configs' / 'resnet' / '5757project_resnet18.py'
+    STUDENT_WEIGHTS = MODEL_DIR / 'student.pth'
+    
     def __init__(self):
         self.model = None
         self.last_inference_time = 0
@@ -106,6 +128,16 @@ class SurgicalPhaseClassifier:
         self.avg_inference_time = 0
         self.resolution = None
         self.model_info = None
+        self.model_version = None  # Short digest of the weights, used to key cached results
+        self.mode_stats = {mode: {'frames': 0, 'avg_time': 0.0} for mode in self.INFERENCE_MODES}
+        self.temporal_head = None
+        self.student = None  # Loaded on first cascade request
+        self.student_unavailable = False
+        self.cascade_threshold = 0.85  # Default student top-1 confidence needed to skip the ResNet-50
+        self.cascade_stats = {'frames': 0, 'escalated': 0, 'student_time': 0.0, 'full_time': 0.0}
+        # Consumers, broadcasters and multi-source ticks all predict on worker threads;
+        # the prediction cache, model pipelines and counters are not thread-safe
+        self._lock = threading.RLock()
         self.load_model()
     
     def load_model(self):
@@ -132,12 +164,45 @@ class SurgicalPhaseClassifier:
             
             # Store model info for frontend display
             self.model_info = "ResNet (Surgical Phase)"
+            self.model_version = file_digest(model_weights)[:12]
+            
+            # Reuse the trained linear layer for clip-level predictions
+            fc = self.model.model.head.fc
+            self.temporal_head = TemporalHead(
+                fc.weight.detach().cpu().numpy(), fc.bias.detach().cpu().numpy(), decay=self.TEMPORAL_DECAY
+            )
             
             logger.info(f"Model loaded successfully in {time.time() - start_time:.2f} seconds")
         except Exception as e:
             logger.error(f"Error loading model: {e}", exc_info=True)
             self.model = None
     
+    def load_student(self):
+        """Load the cascade's gating model; returns False if it isn't available"""
+        if self.student is not None:
+            return True
+        if self.student_unavailable:
+            return False
+        
+        if not self.STUDENT_CONFIG.exists() or not self.STUDENT_WEIGHTS.exists():
+            logger.warning(f"Student model not found at {self.STUDENT_WEIGHTS}, cascade mode will use the full model only")
+            self.student_unavailable = True
+            return False
+        
+        try:
+            start_time = time.time()
+            self.student = ImageClassificationInferencer(
+                model=str(self.STUDENT_CONFIG),
+                pretrained=str(self.STUDENT_WEIGHTS),
+                device="cuda" if torch.cuda.is_available() else "cpu"
+            )
+            logger.info(f"Student model loaded in {time.time() - start_time:.2f} seconds")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading student model: {e}", exc_info=True)
+            self.student_unavailable = True
+            return False
+    
     def preprocess_frame(self, frame):
         """Preprocess the frame for model input"""
         try:
@@ -160,33 +225,140 @@ class SurgicalPhaseClassifier:
         try:
             if frame is None:
                 logger.error("Frame is None, cannot predict")
-                return "Error", {}
+                return NO_PREDICTION, None
             
             # Get prediction
             result = self.model(frame)[0]
-            
-            # Extract prediction and confidence scores
-            pred_class = result['pred_class']
-            scores = result['pred_scores']
-            
-            # Convert scores to percentage
-            confidence_dict = {cls: float(round(score * 100, 2)) for cls, score in zip(self.CLASSES, scores)}
-            
-            return pred_class, confidence_dict
+            return self.to_prediction(result['pred_scores'])
         except Exception as e:
             logger.error(f"Prediction error: {e}")
-            return "Error", {}
+            return NO_PREDICTION, None
+    
+    def to_prediction(self, scores):
+        """Convert a class probability vector to (class index, float32 scores)"""
+        scores = np.asarray(scores, dtype=np.float32)
+        return int(np.argmax(scores)), scores
+    
+    def predict_batch(self, frames, thresholds=None):
+        """
+        Classify RGB frames in one forward pass.
+        Returns (class indices (N,), scores (N, classes)), both NumPy. With
+        `thresholds` (scalar or per-class vector, see scores.threshold_vector)
+        frames whose top class is below its threshold get NO_PREDICTION.
+        """
+        with self._lock:
+            scores, _ = self.forward_batch(frames)
+        scores = scores.astype(np.float32, copy=False)
+        if thresholds is None:
+            return np.argmax(scores, axis=1), scores
+        return thresholded_argmax(scores, thresholds), scores
+    
+    def forward_batch(self, frames):
+        """
+        Run RGB frames through the network in one batch.
+        Returns (scores, embeddings): softmax probabilities (N, classes) and
+        the pooled backbone features (N, EMBEDDING_DIM) the head is applied to.
+        """
+        classifier = self.model.model
+        scores, embeddings = [], []
+        with torch.no_grad():
+            for data in self.model.preprocess(frames, batch_size=len(frames)):
+                data = classifier.data_preprocessor(data, False)
+                feats = classifier.extract_feat(data['inputs'])
+                logits = classifier.head(feats)
+                scores.append(torch.softmax(logits, dim=1).cpu().numpy())
+                embeddings.append(feats[-1].cpu().numpy())
+        return np.concatenate(scores), np.concatenate(embeddings)
+    
+    def tta_views(self, frame):
+        """Test-time augmentation views of a frame: full, flipped, centre and two corner crops"""
+        height, width = frame.shape[:2]
+        crop_h, crop_w = int(height * self.TTA_CROP_RATIO), int(width * self.TTA_CROP_RATIO)
+        top, left = (height - crop_h) // 2, (width - crop_w) // 2
+        return [
+            frame,
+            cv2.flip(frame, 1),
+            np.ascontiguousarray(frame[top:top + crop_h, left:left + crop_w]),
+            np.ascontiguousarray(frame[:crop_h, :crop_w]),
+            np.ascontiguousarray(frame[height - crop_h:, width - crop_w:]),
+        ]
+    
+    def predict_tta(self, frame, embeddings=None):
+        """Average the class scores of all TTA views, scored as one batch in a single forward pass"""
+        scores, features = self.forward_batch(self.tta_views(frame))
+        if embeddings is not None:
+            embeddings.append(features[0])  # The unaugmented view
+        return self.to_prediction(scores.mean(axis=0))
+    
+    def predict_with_embeddings(self, frame, embeddings, mode):
+        """Single backbone pass that also appends the frame's embedding to the stream's buffer"""
+        scores, features = self.forward_batch([frame])
+        embeddings.append(features[0])
+        if mode == 'temporal' and self.temporal_head is not None:
+            scores = self.temporal_head(embeddings.window())[None]
+        return self.to_prediction(scores[0])
     
-    def predict(self, frame):
+    def predict_cascade(self, frame, embeddings=None, threshold=None):
+        """
+        Score the frame with the student model and only run the ResNet-50 when the
+        student's top-1 confidence is below `threshold` (default cascade_threshold).
+        """
+        if threshold is None:
+            threshold = self.cascade_threshold
+        stats = self.cascade_stats
+        stats['frames'] += 1
+        
+        if self.load_student():
+            start_time = time.time()
+            scores = np.asarray(self.student(frame)[0]['pred_scores'])
+            student_time = time.time() - start_time
+            stats['student_time'] += (student_time - stats['student_time']) / stats['frames']
+            if scores.max() >= threshold:
+                return self.to_prediction(scores)
+        
+        # Escalate to the full model
+        stats['escalated'] += 1
+        start_time = time.time()
+        if embeddings is not None:
+            prediction = self.predict_with_embeddings(frame, embeddings, 'standard')
+        else:
+            prediction = self.predict_cached(frame)
+        full_time = time.time() - start_time
+        stats['full_time'] += (full_time - stats['full_time']) / stats['escalated']
+        return prediction
+    
+    def get_cascade_stats(self):
+        """Escalation rate and per-tier mean latency (ms) for the stats page"""
+        stats = self.cascade_stats
+        return {
+            'frames': stats['frames'],
+            'escalated': stats['escalated'],
+            'escalation_rate': round(stats['escalated'] / stats['frames'] * 100, 1) if stats['frames'] else 0,
+            'student_time': round(stats['student_time'] * 1000, 2),
+            'full_time': round(stats['full_time'] * 1000, 2),
+            'student_loaded': self.student is not None,
+            'threshold': self.cascade_threshold,
+        }
+    
+    def predict(self, frame, mode='standard', embeddings=None, threshold=None):
         """
         Predict the surgical phase from a video frame
-        Returns tuple of (predicted_class, confidence_scores)
+        Returns tuple of (class index, float32 probability vector); the index is
+        NO_PREDICTION and the scores None when the frame could not be classified
+        
+        `embeddings` is the caller's EmbeddingRingBuffer; when given, the frame's
+        backbone embedding is appended to it (required for 'temporal' mode).
+        `threshold` overrides the cascade escalation threshold for this call.
         """
+        with self._lock:
+            return self._predict(frame, mode, embeddings, threshold)
+    
+    def _predict(self, frame, mode, embeddings, threshold):
         if self.model is None:
             logger.warning("Model not loaded, attempting to reload")
             self.load_model()
             if self.model is None:
-                return "Model not loaded", {}
+                return NO_PREDICTION, None
         
         try:
             start_time = time.time()
@@ -194,13 +366,22 @@ class SurgicalPhaseClassifier:
             # Check if frame is valid
             if frame is None or not isinstance(frame, np.ndarray):
                 logger.error(f"Invalid frame type: {type(frame)}")
-                return "Invalid frame", {}
-            
-            # Preprocess the frame
-            processed_frame = self.preprocess_frame(frame)
+                return NO_PREDICTION, None
             
-            # Get prediction using the cached method
-            pred_class, confidence_dict = self.predict_cached(processed_frame)
+            # No-op unless the profiler endpoint armed a torch capture
+            with get_torch_capture().capture(mode):
+                # Preprocess the frame
+                processed_frame = self.preprocess_frame(frame)
+                
+                if mode == 'tta':
+                    pred_index, scores = self.predict_tta(processed_frame, embeddings)
+                elif mode == 'cascade':
+                    pred_index, scores = self.predict_cascade(processed_frame, embeddings, threshold)
+                elif embeddings is not None:
+                    pred_index, scores = self.predict_with_embeddings(processed_frame, embeddings, mode)
+                else:
+                    # Get prediction using the cached method
+                    pred_index, scores = self.predict_cached(processed_frame)
             
             # Update performance metrics
             inference_time = time.time() - start_time
@@ -208,16 +389,22 @@ class SurgicalPhaseClassifier:
             self.frames_processed += 1
             self.avg_inference_time = ((self.frames_processed - 1) * self.avg_inference_time + inference_time) / self.frames_processed
             
-            return pred_class, confidence_dict
+            # Per-mode metrics so the extra cost of TTA is visible on the stats page
+            stats = self.mode_stats.setdefault(mode, {'frames': 0, 'avg_time': 0.0})
+            stats['frames'] += 1
+            stats['avg_time'] += (inference_time - stats['avg_time']) / stats['frames']
+            
+            return pred_index, scores
         except Exception as e:
             logger.error(f"Prediction error: {e}", exc_info=True)
-            return "Error", {}
+            return NO_PREDICTION, None
     
     def get_model_info(self):
         """Return model information for frontend display"""
         return {
             "model_name": self.model_info or "Unknown",
             "resolution": self.resolution or "Unknown",
+            "model_version": self.model_version or "Unknown",
             "avg_inference_time": f"{self.avg_inference_time * 1000:.2f} ms" if self.avg_inference_time else "Unknown"
         }
 
@@ -0,0 +1,27 @@
+# videostream/models.py
+from django.db import models
+
+
+class PhasePrediction(models.Model):
+    """One classified frame of a stream, stored compactly for later timeline queries"""
+
+    # Hex uuid issued to each WebSocket connection
+    session_id = models.CharField(max_length=32)
+    # Seconds since the epoch when the prediction was made
+    timestamp = models.FloatField()
+    frame_index = models.IntegerField()
+    # Index into SurgicalPhaseClassifier.CLASSES
+    phase = models.PositiveSmallIntegerField()
+    # Top-1 confidence in [0, 1]
+    confidence = models.FloatField()
+    # All class scores packed as little-endian float16 (2 bytes per class)
+    scores = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_id', 'timestamp'], name='phasepred_session_ts_idx'),
+            models.Index(fields=['timestamp'], name='phasepred_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id}@{self.timestamp:.2f}: {self.phase}"
@@ -0,0 +1,165 @@
+# videostream/multisource.py
+import asyncio
+import logging
+import time
+
+from .decoders import open_video
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_SOURCES = 8
+MAX_SOURCE_ID = 32  # Bytes; source IDs prefix every tagged binary frame
+
+
+def parse_tagged_frame(data):
+    """
+    Split a tagged client frame: one length byte, the UTF-8 source ID, then
+    the JPEG. Returns (source_id, jpeg bytes).
+    """
+    length = data[0]
+    if not 0 < length <= MAX_SOURCE_ID or len(data) <= length + 1:
+        raise ValueError("Malformed tagged frame")
+    return bytes(data[1:1 + length]).decode('utf-8'), data[1 + length:]
+
+
+class _Source:
+    """One named source: a server-side catalogue video, or frames pushed by the client"""
+
+    def __init__(self, source_id, video=None):
+        self.id = source_id
+        self.video = video  # Catalogue entry, None for client-fed sources
+        self.decoder = None
+        self.fps = 30.0
+        self.position = 0
+        self.ended = False
+        self.frame = None  # Latest client frame and when it arrived
+        self.frame_time = 0.0
+        self.lock = asyncio.Lock()  # Held while a worker thread decodes, so close() waits for it
+        self.reading = None  # Decode running on the executor, if any
+
+
+class MultiSourceSession:
+    """
+    Several named sources carried by one WebSocket connection.
+
+    Every tick takes one frame from each source and classifies them together
+    in a single batched forward pass. Catalogue videos advance in lockstep by
+    presentation time (so sources with different frame rates stay aligned);
+    client-fed sources contribute their most recent frame if it is fresher
+    than MAX_FRAME_AGE. Each result carries the tick time plus the source's
+    own frame time, so the client can see how far apart the views were.
+    With per-class thresholds, a result whose top class is below its threshold
+    is reported as uncertain; results also list their top_k best phases.
+    """
+
+    MAX_FRAME_AGE = 1.0  # Seconds before a client frame is considered stale
+
+    def __init__(self, model, tick_interval, thresholds=None, top_k=0):
+        self.model = model
+        self.tick_interval = tick_interval
+        self.thresholds = thresholds  # Per-class vector; unsure results get NO_PREDICTION
+        self.top_k = top_k  # Alternatives listed with each result, 0 for none
+        self.sources = {}
+        self.predictions = {}  # source_id -> last (class index, scores)
+        self.started = None
+
+    def add_source(self, source_id, video=None):
+        if not source_id or len(source_id.encode('utf-8')) > MAX_SOURCE_ID:
+            raise ValueError(f"Source IDs must be 1-{MAX_SOURCE_ID} bytes")
+        if source_id in self.sources:
+            raise ValueError(f"Duplicate source ID: {source_id}")
+        if len(self.sources) >= MAX_SOURCES:
+            raise ValueError(f"At most {MAX_SOURCES} sources per session")
+        self.sources[source_id] = _Source(source_id, video)
+
+    async def open(self):
+        """Open the decoders of catalogue video sources (off the event loop)"""
+        loop = asyncio.get_running_loop()
+        for source in self.sources.values():
+            if source.video is not None:
+                source.decoder = await loop.run_in_executor(None, open_video, source.video['path'])
+                if not source.decoder.isOpened():
+                    raise ValueError(f"Could not open video for source {source.id}")
+                source.fps = source.decoder.fps
+        self.started = time.time()
+
+    def push(self, source_id, frame):
+        """Store the newest client frame for a client-fed source"""
+        source = self.sources.get(source_id)
+        if source is None or source.video is not None:
+            raise ValueError(f"Unknown client source: {source_id}")
+        source.frame = frame
+        source.frame_time = time.time()
+
+    async def _read(self, source, target):
+        """Decode frame `target` of a video source on a worker thread"""
+        async with source.lock:
+            if source.decoder is None:
+                return False, None, target
+            loop = asyncio.get_running_loop()
+            source.reading = loop.run_in_executor(None, source.decoder.read_at, target)
+            # Shielded: a cancelled tick leaves the decode for close() to wait on
+            return await asyncio.shield(source.reading)
+
+    async def collect(self, video_time):
+        """
+        One frame per source for this tick: {source_id: (frame, alignment info)}.
+        Video sources are read at `video_time` seconds; ended or stale sources are left out.
+        The info gives each frame's offset (skew, seconds) from the tick's reference time.
+        """
+        now = time.time()
+        reads = {}
+        for source in self.sources.values():
+            if source.video is not None and not source.ended:
+                target = int(round(video_time * source.fps))
+                reads[source.id] = self._read(source, target)
+
+        frames = {}
+        for source_id, read in zip(reads, await asyncio.gather(*reads.values())):
+            source = self.sources[source_id]
+            ret, frame, position = read
+            if not ret:
+                source.ended = True
+                continue
+            source.position = position
+            frames[source_id] = (frame, {
+                'position': position,
+                'video_time': round(position / source.fps, 3),
+                'skew': round(position / source.fps - video_time, 3),
+            })
+
+        for source in self.sources.values():
+            if source.video is None and source.frame is not None and now - source.frame_time <= self.MAX_FRAME_AGE:
+                frames[source.id] = (source.frame, {
+                    'captured_at': source.frame_time,
+                    'skew': round(source.frame_time - now, 3),
+                })
+                source.frame = None  # Each client frame is classified once
+        return frames
+
+    def classify(self, frames):
+        """Blocking batched inference over the frames of one tick; returns (indices, scores)"""
+        batch = [self.model.preprocess_frame(frame) for frame in frames]
+        return self.model.predict_batch(batch, self.thresholds)
+
+    @property
+    def live(self):
+        """True if any source is fed by the client (cameras)"""
+        return any(source.video is None for source in self.sources.values())
+
+    @property
+    def finished(self):
+        """True once every source is a video that has reached its end"""
+        return all(source.video is not None and source.ended for source in self.sources.values())
+
+    async def close(self):
+        """Release the decoders once no worker thread is reading from them"""
+        for source in self.sources.values():
+            async with source.lock:
+                if source.reading is not None:
+                    await asyncio.wait({source.reading})
+                    source.reading = None
+                if source.decoder is not None:
+                    source.decoder.release()
+                    source.decoder = None
@@ -0,0 +1,130 @@
+# videostream/profiler.py
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import torch
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Low-overhead stack sampler for the running server.
+
+    A timer thread snapshots every other thread's Python stack each `interval`
+    seconds via sys._current_frames() and counts identical stacks. Nothing is
+    hooked into the profiled code, so the cost is one stack walk per thread
+    per sample. collapsed() returns the counts in the folded format read by
+    flamegraph.pl and speedscope ("thread;outer;...;inner count").
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.counts[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self, duration):
+        deadline = time.monotonic() + duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            self._sample()
+            self._stop.wait(self.interval)
+        self.elapsed = time.monotonic() - self.started
+
+    def start(self, duration):
+        """Sample for `duration` seconds on a background thread"""
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, args=(duration,), name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class TorchCapture:
+    """Runs torch.profiler around the next few classifier predict() calls"""
+
+    ROW_LIMIT = 30
+
+    def __init__(self):
+        self.remaining = 0
+        self.tables = []
+        self._lock = threading.Lock()
+
+    def arm(self, calls):
+        with self._lock:
+            self.remaining = calls
+            self.tables = []
+
+    def disarm(self):
+        """Stop capturing and return the tables collected since arm()"""
+        with self._lock:
+            self.remaining = 0
+            return self.tables
+
+    def _claim(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    @contextmanager
+    def capture(self, label):
+        """Profile the wrapped block if captures are armed, otherwise a no-op"""
+        if not self._claim():
+            yield
+            return
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+            yield
+        try:
+            table = prof.key_averages().table(sort_by='self_cpu_time_total', row_limit=self.ROW_LIMIT)
+            with self._lock:
+                self.tables.append({'call': label, 'table': table})
+        except Exception as e:
+            logger.warning(f"Could not summarise torch profile: {e}")
+
+
+# Only one sampling session runs at a time
+profile_lock = threading.Lock()
+
+_torch_capture = TorchCapture()
+
+def get_torch_capture():
+    return _torch_capture
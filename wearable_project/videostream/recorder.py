@@ -0,0 +1,142 @@
+# videostream/recorder.py
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from .model_interface import SurgicalPhaseClassifier
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class PredictionRecorder:
+    """
+    Batched, asynchronous writer for streamed phase predictions.
+
+    `record` only appends a tuple to an in-memory buffer so it is cheap enough to
+    call from the event loop. A background thread flushes the buffer to the
+    database every `batch_size` rows or `flush_interval` seconds, whichever
+    comes first.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=2.0, max_buffer=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='prediction-recorder', daemon=True)
+        self._thread.start()
+
+    def record(self, session_id, frame_index, pred_index, scores, timestamp=None):
+        """Queue one prediction (class index, probability vector) for writing; never blocks on the database"""
+        if pred_index < 0:
+            return  # Frames the model could not classify are not worth persisting
+        row = (session_id, timestamp or time.time(), frame_index, pred_index, scores)
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # Database is not keeping up; drop the oldest row rather than grow without bound
+                self._buffer.popleft()
+                self.rows_dropped += 1
+            self._buffer.append(row)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything currently buffered (runs on the calling thread)"""
+        with self._lock:
+            rows, self._buffer = self._buffer, deque()
+        if not rows:
+            return 0
+
+        # Imported lazily so the module can be imported before the app registry is ready
+        from .models import PhasePrediction
+
+        objects = []
+        for session_id, timestamp, frame_index, phase, scores in rows:
+            objects.append(PhasePrediction(
+                session_id=session_id,
+                timestamp=timestamp,
+                frame_index=frame_index,
+                phase=phase,
+                confidence=float(scores[phase]),
+                scores=np.asarray(scores, dtype='<f2').tobytes(),
+            ))
+
+        try:
+            PhasePrediction.objects.bulk_create(objects, batch_size=self.batch_size)
+            self.rows_written += len(objects)
+        except Exception as e:
+            logger.error(f"Error writing {len(objects)} predictions: {e}")
+        finally:
+            close_old_connections()
+        return len(objects)
+
+    def stop(self):
+        """Stop the writer thread after a final flush"""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=5.0)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Prediction recorder flush failed: {e}", exc_info=True)
+        self.flush()
+
+
+def phase_durations(session_id):
+    """
+    Return {class_name: seconds} for a recorded session.
+
+    Each prediction is assumed to hold until the next one, so the last row of
+    the session does not contribute any time.
+    """
+    from .models import PhasePrediction
+
+    rows = (PhasePrediction.objects
+            .filter(session_id=session_id)
+            .order_by('timestamp')
+            .values_list('timestamp', 'phase'))
+    durations = {cls: 0.0 for cls in SurgicalPhaseClassifier.CLASSES}
+    previous = None
+    for timestamp, phase in rows.iterator():
+        if previous is not None:
+            durations[SurgicalPhaseClassifier.CLASSES[previous[1]]] += timestamp - previous[0]
+        previous = (timestamp, phase)
+    return durations
+
+
+def decode_scores(blob):
+    """Unpack the float16 score blob stored on PhasePrediction.scores"""
+    return np.frombuffer(bytes(blob), dtype='<f2').astype(np.float32)
+
+
+# Singleton instance
+recorder = None
+
+def get_recorder():
+    """Get or create singleton recorder instance"""
+    global recorder
+    if recorder is None:
+        recorder = PredictionRecorder(
+            batch_size=getattr(settings, 'PREDICTION_RECORDER_BATCH_SIZE', 200),
+            flush_interval=getattr(settings, 'PREDICTION_RECORDER_FLUSH_INTERVAL', 2.0),
+        )
+        atexit.register(recorder.stop)
+    return recorder
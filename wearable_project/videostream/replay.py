@@ -0,0 +1,104 @@
+# videostream/replay.py
+import json
+import logging
+import struct
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WPRS1\n'
+TEXT, BINARY = 0, 1
+_HEADER = struct.Struct('<I')  # Length of the JSON metadata block
+_EVENT = struct.Struct('<dBI')  # Offset in seconds since connect, kind, payload length
+
+
+class TrafficRecorder:
+    """
+    Writes what a client sends on one WebSocket connection to a compact file.
+
+    The file starts with MAGIC and a JSON block (connection query string,
+    session ID, model version, start time), followed by one event per received
+    message: its offset from connect, whether it was text or binary, and the
+    raw payload. Webcam frames stay as the client's JPEG bytes. Frame
+    acknowledgements are left out because they only reflect the original
+    client's timing; the replay harness acknowledges frames itself.
+    """
+
+    def __init__(self, path, meta):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'wb', buffering=1 << 20)
+        header = json.dumps(meta).encode('utf-8')
+        self._file.write(MAGIC + _HEADER.pack(len(header)) + header)
+        self.start = time.monotonic()
+        self.events = 0
+
+    def record(self, text_data=None, bytes_data=None):
+        if self._file is None:
+            return
+        if text_data is not None:
+            if '"frame_ack"' in text_data:
+                return
+            kind, payload = TEXT, text_data.encode('utf-8')
+        elif bytes_data is not None:
+            kind, payload = BINARY, bytes_data
+        else:
+            return
+        try:
+            self._file.write(_EVENT.pack(time.monotonic() - self.start, kind, len(payload)))
+            self._file.write(payload)
+            self.events += 1
+        except OSError as e:
+            logger.error(f"Error recording traffic to {self.path}, recording stopped: {e}")
+            self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Recorded {self.events} client messages to {self.path}")
+
+
+def start_recording(session_id, query_string, model_version=None):
+    """TrafficRecorder for a new connection when SESSION_RECORD_DIR is set, otherwise None"""
+    record_dir = getattr(settings, 'SESSION_RECORD_DIR', None)
+    if not record_dir:
+        return None
+    # A replay should start a fresh stream, not resume the recorded one
+    query = urlencode([(k, v) for k, v in parse_qsl(query_string) if k != 'resume'])
+    meta = {
+        'session_id': session_id,
+        'query_string': query,
+        'model_version': model_version,
+        'recorded_at': time.time(),
+    }
+    try:
+        return TrafficRecorder(Path(record_dir) / f"{session_id}.wprs", meta)
+    except OSError as e:
+        logger.error(f"Could not start traffic recording: {e}")
+        return None
+
+
+def read_recording(path):
+    """Load a recording; returns (metadata dict, [(offset seconds, text or bytes), ...])"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        (length,) = _HEADER.unpack(f.read(_HEADER.size))
+        meta = json.loads(f.read(length))
+        events = []
+        while True:
+            header = f.read(_EVENT.size)
+            if len(header) < _EVENT.size:
+                break  # A recording cut short by a crash still replays up to its last full event
+            offset, kind, length = _EVENT.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                break
+            events.append((offset, payload.decode('utf-8') if kind == TEXT else payload))
+    return meta, events
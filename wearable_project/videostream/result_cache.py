@@ -0,0 +1,241 @@
+# videostream/result_cache.py
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .model_interface import SurgicalPhaseClassifier, file_digest
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path, write):
+    """
+    Write a file through a uniquely named temporary file next to it, then rename it
+    into place, so concurrent writers of the same path never leave a torn file.
+    `write` is called with the open binary file.
+    """
+    path = Path(path)
+    f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix='.part', delete=False)
+    try:
+        with f:
+            write(f)
+        os.replace(f.name, path)
+    except BaseException:
+        Path(f.name).unlink(missing_ok=True)
+        raise
+
+
+class PhaseTimeline:
+    """Predictions for one video at a fixed stride, stored as compact arrays"""
+
+    def __init__(self, frame_indices, phases, scores, fps=0.0, stride=1):
+        self.frame_indices = np.asarray(frame_indices, dtype=np.int32)
+        self.phases = np.asarray(phases, dtype=np.int8)
+        self.scores = np.asarray(scores, dtype=np.float16).reshape(-1, len(SurgicalPhaseClassifier.CLASSES))
+        self.fps = float(fps)
+        self.stride = int(stride)
+        self._positions = {int(idx): row for row, idx in enumerate(self.frame_indices)}
+
+    def __len__(self):
+        return len(self.frame_indices)
+
+    def get(self, frame_index):
+        """Return (class index, scores) for a frame, or None if it was not classified"""
+        row = self._positions.get(frame_index)
+        if row is None:
+            return None
+        return self._prediction(row)
+
+    def nearest(self, frame_index):
+        """Return (frame_index, class index, scores) for the closest classified frame"""
+        if not len(self):
+            return None
+        row = int(np.searchsorted(self.frame_indices, frame_index))
+        if row >= len(self) or (row > 0 and frame_index - self.frame_indices[row - 1] < self.frame_indices[row] - frame_index):
+            row -= 1
+        return (int(self.frame_indices[row]),) + self._prediction(row)
+
+    def _prediction(self, row):
+        return int(self.phases[row]), self.scores[row].astype(np.float32)
+
+    def to_dict(self):
+        """JSON-friendly representation for the timeline endpoint"""
+        classes = SurgicalPhaseClassifier.CLASSES
+        fps = self.fps or 30.0
+        return {
+            'fps': self.fps,
+            'stride': self.stride,
+            'classes': classes,
+            'frames': self.frame_indices.tolist(),
+            'times': np.round(self.frame_indices / fps, 3).tolist(),
+            'stages': [classes[p] for p in self.phases.tolist()],
+            'confidences': np.round(self.scores.astype(np.float32) * 100, 2).tolist(),
+        }
+
+
+class TimelineBuilder:
+    """Accumulates predictions during playback so a complete pass can be cached"""
+
+    def __init__(self, fps, stride):
+        self.fps = fps
+        self.stride = stride
+        self.frame_indices = []
+        self.phases = []
+        self.scores = []
+        self.complete = True  # Cleared when playback skips frames (seek, errors)
+
+    def add(self, frame_index, pred_index, scores):
+        if pred_index < 0:
+            self.complete = False
+            return
+        self.frame_indices.append(frame_index)
+        self.phases.append(pred_index)
+        self.scores.append(scores)
+
+    def is_complete(self):
+        """True if every stride position from frame 0 onwards was classified"""
+        if not self.complete or not self.frame_indices:
+            return False
+        expected = np.arange(len(self.frame_indices)) * self.stride
+        return bool(np.array_equal(np.asarray(self.frame_indices), expected))
+
+    def build(self):
+        return PhaseTimeline(self.frame_indices, self.phases, self.scores, self.fps, self.stride)
+
+
+class ResultCache:
+    """
+    Persistent cache of phase timelines keyed by video content hash, model version
+    and stride. Entries are .npz files evicted by total size and age.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._digest_file = self.cache_dir / 'digests.json'
+        self._digests = self._load_digests()
+
+    def _load_digests(self):
+        try:
+            with open(self._digest_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def video_digest(self, video_path):
+        """
+        Content hash of a video file. Hashing is remembered by (path, size, mtime)
+        so a recording is only read in full the first time it is seen.
+        """
+        stat = os.stat(video_path)
+        marker = f"{stat.st_size}:{int(stat.st_mtime)}"
+        path_key = os.path.abspath(video_path)
+        with self._lock:
+            entry = self._digests.get(path_key)
+            if entry and entry['marker'] == marker:
+                return entry['digest']
+
+        digest = file_digest(video_path)
+        with self._lock:
+            self._digests[path_key] = {'marker': marker, 'digest': digest}
+            try:
+                with open(self._digest_file, 'w') as f:
+                    json.dump(self._digests, f)
+            except OSError as e:
+                logger.warning(f"Could not persist video digests: {e}")
+        return digest
+
+    def make_key(self, video_path, model_version, stride):
+        return f"{self.video_digest(video_path)[:32]}-{model_version}-s{stride}"
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.npz"
+
+    def load(self, key):
+        """Return the cached PhaseTimeline for a key, or None"""
+        path = self._entry_path(key)
+        try:
+            with np.load(path) as data:
+                timeline = PhaseTimeline(
+                    data['frame_indices'], data['phases'], data['scores'],
+                    fps=float(data['fps']), stride=int(data['stride'])
+                )
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.error(f"Discarding unreadable cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # Touch the entry so size-based eviction drops least recently used first
+        os.utime(path)
+        self.hits += 1
+        return timeline
+
+    def store(self, key, timeline):
+        """Write a timeline atomically, then enforce the size and age limits"""
+        path = self._entry_path(key)
+        write_atomic(path, lambda f: np.savez_compressed(
+            f,
+            frame_indices=timeline.frame_indices,
+            phases=timeline.phases,
+            scores=timeline.scores,
+            fps=np.float32(timeline.fps),
+            stride=np.int32(timeline.stride),
+        ))
+        logger.info(f"Cached {len(timeline)} predictions as {path.name}")
+        self.evict()
+
+    def evict(self):
+        """Remove entries older than max_age, then least recently used until under max_bytes"""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob('*.npz'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# Singleton instance
+result_cache = None
+
+def get_result_cache():
+    """Get or create singleton result cache instance"""
+    global result_cache
+    if result_cache is None:
+        result_cache = ResultCache(
+            getattr(settings, 'RESULT_CACHE_DIR', 'cache/results'),
+            max_bytes=getattr(settings, 'RESULT_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+            max_age=getattr(settings, 'RESULT_CACHE_MAX_AGE', 30 * 24 * 3600),
+        )
+    return result_cache
@@ -0,0 +1,169 @@
+# videostream/scheduler.py
+import threading
+import time
+
+from django.conf import settings
+
+
+class _TokenBucket:
+    """Refills at `rate` tokens/s up to `burst`; one token pays for one model call"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class InferenceScheduler:
+    """
+    Shares the node's inference budget (model calls per second) between streams.
+
+    Every stream has a hard per-stream quota and a fair share of the global
+    budget, weighted by priority so live camera streams get more than video
+    replays. A stream over its share may still borrow unused budget, but
+    replays must leave a reserve for live streams. Frames that aren't admitted
+    should be degraded (reuse the last prediction) rather than queued, unless
+    the caller can slow down instead (a backend video pass filling the result
+    cache). New streams are rejected once MAX_STREAMS are registered.
+    """
+
+    PRIORITY_WEIGHTS = {'live': 3.0, 'replay': 1.0}
+    REPLAY_RESERVE = 0.5  # Fraction of the global burst replays may not borrow into
+
+    def __init__(self, budget_fps=30.0, stream_fps=10.0, max_streams=16, burst_seconds=1.0):
+        self.budget_fps = budget_fps
+        self.stream_fps = stream_fps
+        self.max_streams = max_streams
+        self.burst_seconds = burst_seconds
+        self.budget = _TokenBucket(budget_fps, max(1.0, budget_fps * burst_seconds))
+        self.streams = {}  # stream_id -> {'priority', 'quota', 'share', 'admitted', 'degraded'}
+        self.admitted = 0
+        self.degraded = {'quota': 0, 'share': 0, 'saturated': 0}
+        self.rejected_streams = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.admitted_fps = 0.0
+        self._lock = threading.Lock()  # admit() is also called from broadcaster worker code
+
+    def register(self, stream_id, priority='replay'):
+        """Add a stream; returns False when the node is already serving max_streams"""
+        with self._lock:
+            if stream_id not in self.streams and len(self.streams) >= self.max_streams:
+                self.rejected_streams += 1
+                return False
+            burst = max(1.0, self.stream_fps * self.burst_seconds)
+            self.streams[stream_id] = {
+                'priority': priority,
+                'quota': _TokenBucket(self.stream_fps, burst),
+                'share': _TokenBucket(self.stream_fps, burst),
+                'admitted': 0,
+                'degraded': 0,
+            }
+            self._rebalance()
+            return True
+
+    def unregister(self, stream_id):
+        with self._lock:
+            if self.streams.pop(stream_id, None) is not None:
+                self._rebalance()
+
+    def set_priority(self, stream_id, priority):
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            if stream is not None and stream['priority'] != priority:
+                stream['priority'] = priority
+                self._rebalance()
+
+    def _rebalance(self):
+        """Recompute each stream's fair share of the budget from the priority weights"""
+        total = sum(self.PRIORITY_WEIGHTS[s['priority']] for s in self.streams.values())
+        for stream in self.streams.values():
+            share = self.budget_fps * self.PRIORITY_WEIGHTS[stream['priority']] / total
+            stream['share'].rate = min(share, self.stream_fps)
+
+    def admit(self, stream_id, cost=1, degrade=True):
+        """
+        Whether `stream_id` may run the model on its next `cost` frames; consumes budget if so.
+        With degrade=False a refusal isn't counted as degraded, for callers that wait and retry.
+        """
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                return True  # Unmanaged callers (e.g. management commands) aren't limited
+            now = time.monotonic()
+            self.budget.refill(now)
+            stream['quota'].refill(now)
+            stream['share'].refill(now)
+
+            reason = None
+            if stream['quota'].tokens < cost:
+                reason = 'quota'
+            elif self.budget.tokens < cost:
+                reason = 'saturated'
+            elif stream['share'].tokens < cost:
+                # Over its fair share: only borrow budget other streams aren't using
+                reserve = self.budget.burst * self.REPLAY_RESERVE if stream['priority'] == 'replay' else 0
+                if self.budget.tokens - cost < reserve:
+                    reason = 'share'
+
+            if reason is not None:
+                if degrade:
+                    self.degraded[reason] += cost
+                    stream['degraded'] += cost
+                return False
+
+            self.budget.tokens -= cost
+            stream['quota'].tokens -= cost
+            stream['share'].tokens = max(stream['share'].tokens - cost, 0)
+            stream['admitted'] += cost
+            self.admitted += cost
+            self._count(now, cost)
+            return True
+
+    def _count(self, now, n=1):
+        self._window_count += n
+        if now - self._window_start >= 1.0:
+            self.admitted_fps = self._window_count / (now - self._window_start)
+            self._window_start = now
+            self._window_count = 0
+
+    def stats(self):
+        """Counters for the stats page"""
+        with self._lock:
+            by_priority = {}
+            for stream in self.streams.values():
+                by_priority[stream['priority']] = by_priority.get(stream['priority'], 0) + 1
+            degraded = sum(self.degraded.values())
+            total = self.admitted + degraded
+            return {
+                'budget_fps': self.budget_fps,
+                'stream_fps': self.stream_fps,
+                'max_streams': self.max_streams,
+                'active_streams': len(self.streams),
+                'streams_by_priority': by_priority,
+                'admitted': self.admitted,
+                'admitted_fps': round(self.admitted_fps, 1),
+                'degraded': dict(self.degraded),
+                'degraded_rate': round(degraded / total * 100, 1) if total else 0,
+                'rejected_streams': self.rejected_streams,
+            }
+
+
+# Singleton instance
+_scheduler = None
+
+def get_scheduler():
+    """Get or create the node-wide inference scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = InferenceScheduler(
+            budget_fps=getattr(settings, 'INFERENCE_BUDGET_FPS', 30.0),
+            stream_fps=getattr(settings, 'INFERENCE_STREAM_FPS', 10.0),
+            max_streams=getattr(settings, 'INFERENCE_MAX_STREAMS', 16),
+        )
+    return _scheduler
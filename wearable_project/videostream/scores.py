@@ -0,0 +1,61 @@
+# videostream/scores.py
+"""
+Helpers for class score vectors.
+
+Predictions travel through the app as (class index, float32 probability
+vector). These functions work on a single vector of shape (classes,) or on
+a batch of shape (N, classes). Display formatting (class names, rounded
+percentages) happens once, in `to_display` and `top_k_display`, when a
+message is serialised.
+"""
+import numpy as np
+
+NO_PREDICTION = -1  # Class index returned when the model could not classify a frame
+
+
+def top_k(scores, k=3):
+    """Indices and scores of the k best classes, best first, along the last axis"""
+    scores = np.asarray(scores)
+    k = min(k, scores.shape[-1])
+    indices = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    values = np.take_along_axis(scores, indices, axis=-1)
+    order = np.argsort(-values, axis=-1)
+    return np.take_along_axis(indices, order, axis=-1), np.take_along_axis(values, order, axis=-1)
+
+
+def threshold_vector(thresholds, classes, default=0.0):
+    """Per-class thresholds as a vector; `thresholds` is a {class name: probability} mapping"""
+    return np.array([thresholds.get(cls, default) for cls in classes], dtype=np.float32)
+
+
+def above_thresholds(scores, thresholds):
+    """Boolean mask of classes whose score reaches their threshold (scalar or per-class vector)"""
+    return np.asarray(scores) >= thresholds
+
+
+def thresholded_argmax(scores, thresholds):
+    """Top class index, or NO_PREDICTION where it is below its class threshold"""
+    scores = np.asarray(scores)
+    indices = np.argmax(scores, axis=-1)
+    best = np.take_along_axis(scores, np.expand_dims(indices, -1), axis=-1)[..., 0]
+    limit = np.broadcast_to(np.asarray(thresholds, dtype=np.float32), scores.shape[-1:])[indices]
+    return np.where(best >= limit, indices, NO_PREDICTION)
+
+
+def to_display(index, scores, classes):
+    """(stage name, confidence percentages) for a message; the only place scores are formatted"""
+    if scores is None:
+        return "Error", [0] * len(classes)
+    confidences = np.round(np.asarray(scores, dtype=np.float32) * 100, 2).tolist()
+    if index is None or index < 0:
+        return "Uncertain", confidences  # Scored, but below its class threshold
+    return classes[index], confidences
+
+
+def top_k_display(indices, values, classes):
+    """[{'stage', 'confidence'}, ...] for each row of a batched `top_k` result"""
+    percentages = np.round(np.asarray(values, dtype=np.float32) * 100, 2).tolist()
+    return [
+        [{'stage': classes[i], 'confidence': p} for i, p in zip(row, row_percentages)]
+        for row, row_percentages in zip(np.asarray(indices).tolist(), percentages)
+    ]
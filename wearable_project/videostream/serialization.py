@@ -0,0 +1,67 @@
+# videostream/serialization.py
+import base64
+import json
+
+try:
+    import orjson  # Optional: fast JSON encoder
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # Optional: MessagePack wire format
+except ImportError:
+    msgpack = None
+
+WIRE_FORMATS = ('json', 'msgpack')
+
+# Spliced in after the small message body so the large base64 string is never
+# scanned for characters to escape (base64 has none)
+_IMAGE_OPEN = ',"image":"'
+_IMAGE_CLOSE = '"}'
+
+
+def wire_formats_available():
+    """Wire formats this server can speak, in order of preference"""
+    return ('msgpack', 'json') if msgpack is not None else ('json',)
+
+
+def _dumps_json(message):
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(message, separators=(',', ':'))
+
+
+class MessageSerializer:
+    """
+    Encodes VideoStreamConsumer messages for one connection.
+
+    'json' produces text frames, using orjson when installed; frame messages
+    have their base64 image appended to the already-encoded body instead of
+    going through the encoder. 'msgpack' produces binary frames and carries
+    the JPEG (or fMP4 fragment) as raw bytes, skipping base64 altogether.
+    """
+
+    def __init__(self, wire_format='json'):
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Unknown wire format: {wire_format}")
+        if wire_format == 'msgpack' and msgpack is None:
+            raise ValueError("msgpack wire format needs the msgpack package installed on the server")
+        self.wire_format = wire_format
+        self.binary = wire_format == 'msgpack'
+
+    def dumps(self, message, image=None):
+        """
+        Serialise `message`, attaching JPEG bytes `image` if given.
+        Returns str for text frames and bytes for binary frames.
+        """
+        if self.binary:
+            if image is not None:
+                message = {**message, 'image': image}
+            return msgpack.packb(message, use_bin_type=True)
+        body = _dumps_json(message)
+        if image is None:
+            return body
+        encoded = base64.b64encode(image).decode('ascii')
+        if body == '{}':
+            return '{"image":"' + encoded + _IMAGE_CLOSE
+        return body[:-1] + _IMAGE_OPEN + encoded + _IMAGE_CLOSE
@@ -0,0 +1,107 @@
+# videostream/sessions.py
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SessionStore:
+    """
+    Playback state of recently disconnected streams, keyed by resume token.
+
+    A stream saves a snapshot (source, position, inference mode, recent
+    predictions and embeddings) when its connection drops; a client that
+    reconnects with the token within `ttl` seconds continues from there
+    instead of starting the video over. Snapshots are taken once, so two
+    connections can't resume the same stream, and the oldest are evicted
+    beyond `max_sessions`.
+
+    This store lives in the server process, so a client can only resume on
+    the worker it was connected to; see CacheSessionStore for deployments
+    with several workers or nodes.
+    """
+
+    def __init__(self, ttl=120.0, max_sessions=256):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # token -> (expiry, state), oldest first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @staticmethod
+    def issue_token():
+        return secrets.token_urlsafe(18)
+
+    def save(self, token, state):
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            self._sessions.pop(token, None)
+            self._sessions[token] = (now + self.ttl, state)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def take(self, token):
+        """Remove and return the state saved under `token`, or None if unknown or expired"""
+        with self._lock:
+            entry = self._sessions.pop(token, None)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            return entry[1]
+
+    def _evict(self, now):
+        while self._sessions:
+            token, (expiry, _) = next(iter(self._sessions.items()))
+            if expiry >= now:
+                break
+            del self._sessions[token]
+
+
+class CacheSessionStore:
+    """
+    SessionStore backed by a Django cache, so any worker sharing the cache
+    (e.g. Redis) can resume a stream that was dropped by another one, such as
+    a client sent elsewhere by a draining node. Expiry and eviction are left
+    to the cache; the state is pickled, so the calls block on the backend.
+    """
+
+    KEY_PREFIX = 'videostream:resume:'
+
+    def __init__(self, alias, ttl=120.0):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    issue_token = staticmethod(SessionStore.issue_token)
+
+    def save(self, token, state):
+        self.cache.set(self.KEY_PREFIX + token, state, timeout=self.ttl)
+
+    def take(self, token):
+        """Remove and return the state saved under `token`, or None if unknown or expired"""
+        key = self.KEY_PREFIX + token
+        state = self.cache.get(key)
+        # Only the caller whose delete removes the key gets the state
+        if state is None or not self.cache.delete(key):
+            return None
+        return state
+
+
+# Singleton instance
+_store = None
+
+def get_session_store():
+    """Get or create the resumable session store (shared through SESSION_RESUME_CACHE if set)"""
+    global _store
+    if _store is None:
+        ttl = getattr(settings, 'SESSION_RESUME_TTL', 120.0)
+        alias = getattr(settings, 'SESSION_RESUME_CACHE', None)
+        if alias:
+            _store = CacheSessionStore(alias, ttl=ttl)
+        else:
+            _store = SessionStore(ttl=ttl, max_sessions=getattr(settings, 'SESSION_RESUME_MAX', 256))
+    return _store
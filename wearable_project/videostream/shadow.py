@@ -0,0 +1,216 @@
+# videostream/shadow.py
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+from django.conf import settings
+
+from .encoding import encode_jpeg
+from .metrics import LatencyHistogram
+from .model_interface import ImageClassificationInferencer, SurgicalPhaseClassifier, file_digest
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    """
+    Scores a sample of live frames with a candidate model to compare it with the primary one.
+    Only standard-mode predictions should be offered, since the candidate scores the plain frame.
+
+    `offer` is called after the primary result has been handed to the sender,
+    and only copies a sampled frame into a small queue, so the client never
+    waits for the candidate. A single background thread runs the candidate;
+    when it can't keep up, new samples are dropped instead of queued. For each
+    evaluated frame we record whether the two models agree, both latencies
+    and, on disagreement, a sample (with a thumbnail in `sample_dir`) for review.
+    """
+
+    THUMBNAIL_WIDTH = 320
+
+    def __init__(self, config=None, weights=None, sample_rate=0.1, max_pending=4, max_samples=50, sample_dir=None):
+        self.config = config
+        self.weights = weights
+        self.enabled = bool(config and weights) and sample_rate > 0
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.sample_dir = Path(sample_dir) if sample_dir else None
+        self.candidate = None
+        self.candidate_version = None
+        self.unavailable = False
+        self.classes = SurgicalPhaseClassifier.CLASSES
+        self.counts = {'offered': 0, 'evaluated': 0, 'dropped': 0, 'errors': 0, 'agreed': 0}
+        self.class_counts = np.zeros((len(self.classes), 2), dtype=np.int64)  # Per primary class: evaluated, agreed
+        self.score_l1 = 0.0  # Mean L1 distance between the two score vectors
+        self.primary_latency = LatencyHistogram(window=300)
+        self.candidate_latency = LatencyHistogram(window=300)
+        self.samples = deque(maxlen=max_samples)
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name='shadow-evaluator', daemon=True)
+            self._thread.start()
+
+    def offer(self, frame, pred_index, scores, primary_time, session_id=None, position=None):
+        """Maybe queue a frame the primary model just classified; never blocks"""
+        if not self.enabled or self.unavailable or pred_index < 0 or random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            self.counts['offered'] += 1
+            if len(self._pending) >= self.max_pending:
+                self.counts['dropped'] += 1
+                return
+            # Copy: the frame is still being encoded for the client on another thread
+            self._pending.append((frame.copy(), pred_index, scores, primary_time, session_id, position, time.time()))
+        self._wakeup.set()
+
+    def load_candidate(self):
+        """Load the candidate model on the worker thread; returns False if it isn't available"""
+        if self.candidate is not None:
+            return True
+        if not os.path.exists(self.config) or not os.path.exists(self.weights):
+            logger.warning(f"Shadow model not found at {self.weights}, shadow evaluation disabled")
+            self.unavailable = True
+            return False
+        try:
+            start_time = time.time()
+            self.candidate = ImageClassificationInferencer(
+                model=str(self.config),
+                pretrained=str(self.weights),
+                device="cuda" if torch.cuda.is_available() else "cpu"
+            )
+            self.candidate_version = file_digest(self.weights)[:12]
+            logger.info(f"Shadow model {self.candidate_version} loaded in {time.time() - start_time:.2f} seconds")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading shadow model: {e}", exc_info=True)
+            self.unavailable = True
+            return False
+
+    def evaluate(self, frame, pred_index, scores, primary_time, session_id, position, timestamp):
+        """Run the candidate on one frame and record how it compares (blocking)"""
+        start_time = time.time()
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        candidate_scores = np.asarray(self.candidate(rgb)[0]['pred_scores'], dtype=np.float32)
+        candidate_time = time.time() - start_time
+        candidate_index = int(np.argmax(candidate_scores))
+        agreed = candidate_index == pred_index
+
+        with self._lock:
+            self.counts['evaluated'] += 1
+            self.counts['agreed'] += int(agreed)
+            self.class_counts[pred_index] += (1, int(agreed))
+            distance = float(np.abs(candidate_scores - scores).sum())
+            self.score_l1 += (distance - self.score_l1) / self.counts['evaluated']
+            self.primary_latency.add(primary_time)
+            self.candidate_latency.add(candidate_time)
+
+        if not agreed:
+            self.add_sample(frame, {
+                'timestamp': timestamp,
+                'session_id': session_id,
+                'position': position,
+                'primary': self.classes[pred_index],
+                'primary_confidence': round(float(scores[pred_index]) * 100, 1),
+                'candidate': self.classes[candidate_index],
+                'candidate_confidence': round(float(candidate_scores[candidate_index]) * 100, 1),
+            })
+
+    def add_sample(self, frame, sample):
+        """Keep a disagreement for review, writing a thumbnail when a sample directory is set"""
+        if self.sample_dir is not None:
+            try:
+                height, width = frame.shape[:2]
+                if width > self.THUMBNAIL_WIDTH:
+                    size = (self.THUMBNAIL_WIDTH, max(1, int(height * self.THUMBNAIL_WIDTH / width)))
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                self.sample_dir.mkdir(parents=True, exist_ok=True)
+                name = f"{int(sample['timestamp'] * 1000)}_{sample['primary']}_{sample['candidate']}.jpg"
+                (self.sample_dir / name).write_bytes(encode_jpeg(frame, 80))
+                sample['image'] = name
+            except Exception as e:
+                logger.error(f"Error saving shadow sample: {e}")
+        with self._lock:
+            if len(self.samples) == self.samples.maxlen and self.samples[0].get('image'):
+                # The oldest sample falls out of the window, so does its thumbnail
+                try:
+                    (self.sample_dir / self.samples[0]['image']).unlink()
+                except OSError:
+                    pass
+            self.samples.append(sample)
+
+    def stats(self):
+        """Agreement and latency comparison for the stats page"""
+        with self._lock:
+            counts = dict(self.counts)
+            by_class = {
+                cls: round(agreed / evaluated * 100, 1)
+                for cls, (evaluated, agreed) in zip(self.classes, self.class_counts.tolist()) if evaluated
+            }
+            primary = self.primary_latency.percentiles((50, 95))
+            candidate = self.candidate_latency.percentiles((50, 95))
+            samples = list(self.samples)[-10:]
+        evaluated = counts['evaluated']
+
+        def to_ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            'enabled': self.enabled and not self.unavailable,
+            'candidate_version': self.candidate_version,
+            'sample_rate': self.sample_rate,
+            **counts,
+            'agreement_rate': round(counts['agreed'] / evaluated * 100, 1) if evaluated else None,
+            'agreement_by_class': by_class,
+            'score_l1': round(self.score_l1, 3),
+            'primary_ms': {'p50': to_ms(primary[50]), 'p95': to_ms(primary[95])},
+            'candidate_ms': {'p50': to_ms(candidate[50]), 'p95': to_ms(candidate[95])},
+            'samples': samples[::-1],  # Newest first
+        }
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    item = self._pending.popleft()
+                if not self.load_candidate():
+                    with self._lock:
+                        self._pending.clear()
+                    return
+                try:
+                    self.evaluate(*item)
+                except Exception as e:
+                    with self._lock:
+                        self.counts['errors'] += 1
+                    logger.error(f"Shadow evaluation failed: {e}")
+
+
+# Singleton instance
+_shadow = None
+
+def get_shadow():
+    """Get or create the shadow evaluator (disabled unless a candidate model is configured)"""
+    global _shadow
+    if _shadow is None:
+        _shadow = ShadowEvaluator(
+            config=getattr(settings, 'SHADOW_MODEL_CONFIG', None),
+            weights=getattr(settings, 'SHADOW_MODEL_WEIGHTS', None),
+            sample_rate=getattr(settings, 'SHADOW_SAMPLE_RATE', 0.1),
+            max_pending=getattr(settings, 'SHADOW_MAX_PENDING', 4),
+            max_samples=getattr(settings, 'SHADOW_MAX_SAMPLES', 50),
+            sample_dir=getattr(settings, 'SHADOW_SAMPLE_DIR', None),
+        )
+    return _shadow
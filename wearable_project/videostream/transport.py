@@ -0,0 +1,108 @@
+# videostream/transport.py
+import logging
+from fractions import Fraction
+
+try:
+    import av  # Optional: PyAV with an H.264 encoder (libx264)
+except ImportError:
+    av = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TRANSPORT_MODES = ('jpeg', 'fmp4')
+
+
+def fmp4_available():
+    return av is not None
+
+
+class _ChunkSink:
+    """Write-only file object for the muxer; having no seek() keeps the output streamable"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class FragmentedMP4Encoder:
+    """
+    Encodes frames into a fragmented MP4 (H.264) byte stream for Media Source
+    Extensions players.
+
+    The first chunk returned carries the init segment (ftyp + empty moov);
+    every later chunk is one moof/mdat fragment per frame. Between keyframes
+    fragments only carry the changes, so a mostly static scene costs a fraction
+    of an independent JPEG per frame. Presentation timestamps are what the
+    JSON side channel uses to key predictions. Callers pass their own (the
+    backend frame position), so frames dropped before encoding leave a gap
+    rather than shifting later frames; consecutive frames are `pts_per_frame`
+    apart and play at `fps`.
+    """
+
+    def __init__(self, width, height, fps=30, gop_seconds=2.0, bitrate=None, pts_per_frame=1):
+        if av is None:
+            raise RuntimeError("PyAV is required for the fmp4 transport: pip install av")
+        # yuv420p needs even dimensions
+        self.width = width - width % 2
+        self.height = height - height % 2
+        self.fps = max(1, int(round(fps)))
+        self.pts_per_frame = max(1, int(pts_per_frame))
+        self.pts = 0  # Used when the caller doesn't give a pts
+        self.last_pts = None
+        self._sink = _ChunkSink()
+        self.container = av.open(self._sink, mode='w', format='mp4', options={
+            'movflags': 'empty_moov+default_base_moof+frag_every_frame',
+        })
+        self.stream = self.container.add_stream('libx264', rate=self.fps)
+        self.stream.width = self.width
+        self.stream.height = self.height
+        self.stream.pix_fmt = 'yuv420p'
+        self.stream.time_base = Fraction(1, self.fps * self.pts_per_frame)
+        self.stream.options = {
+            'preset': 'veryfast',
+            'tune': 'zerolatency',
+            'g': str(max(1, int(self.fps * gop_seconds))),
+        }
+        if bitrate:
+            self.stream.bit_rate = int(bitrate)
+
+    def matches(self, frame, pts=None):
+        """Whether the frame can continue this stream: same size, and pts still increasing"""
+        height, width = frame.shape[:2]
+        if pts is not None and self.last_pts is not None and pts <= self.last_pts:
+            return False  # e.g. a seek backwards
+        return width - width % 2 == self.width and height - height % 2 == self.height
+
+    def encode(self, frame, pts=None):
+        """Encode one BGR frame (blocking); returns (bytes produced, pts of the frame)"""
+        video_frame = av.VideoFrame.from_ndarray(frame[:self.height, :self.width], format='bgr24')
+        if pts is None:
+            pts = self.pts
+        video_frame.pts = pts
+        self.last_pts = pts
+        self.pts = pts + self.pts_per_frame
+        for packet in self.stream.encode(video_frame):
+            self.container.mux(packet)
+        return self._sink.take(), pts
+
+    def close(self):
+        """Flush the encoder and return any trailing bytes"""
+        try:
+            for packet in self.stream.encode(None):
+                self.container.mux(packet)
+            self.container.close()
+        except Exception as e:
+            logger.warning(f"Error closing fMP4 encoder: {e}")
+        return self._sink.take()
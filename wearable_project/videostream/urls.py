@@ -7,4 +7,11 @@ urlpatterns = [
     path('ui/', views.surgical_workflow_view, name='surgical_workflow'),  # Surgical workflow visualization
     path('video/', views.video_view, name='video'),  # Simple video view
     path('stats/', views.model_stats_view, name='model_stats'),  # Model statistics
+    path('stats/live/', views.live_stats_view, name='live_stats'),  # Live metrics feed (SSE)
+    path('stats/profile/', views.profile_view, name='profile'),  # Staff-only sampling profiler
+    path('videos/', views.video_catalogue_view, name='video_catalogue'),  # Backend video catalogue
+    path('timeline/', views.timeline_view, name='timeline'),  # Cached phase timeline for a video
+    path('stream/<str:source_id>/mjpeg/', views.mjpeg_stream_view, name='mjpeg_stream'),  # Shared MJPEG stream of a video
+    path('stream/<str:source_id>/events/', views.prediction_events_view, name='prediction_events'),  # Shared prediction SSE stream
+    path('sessions/<str:session_id>/phases/', views.session_phases_view, name='session_phases'),  # Recorded phase durations
 ]
\ No newline at end of file
@@ -0,0 +1,161 @@
+# videostream/video_index.py
+import logging
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .result_cache import get_result_cache, write_atomic
+
+try:
+    import av  # Optional: lets us read keyframe flags without decoding
+except ImportError:
+    av = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class VideoIndex:
+    """Presentation timestamp of every frame plus the positions of keyframes"""
+
+    def __init__(self, timestamps, keyframes, fps):
+        self.timestamps = np.asarray(timestamps, dtype=np.float32)  # Seconds, one per frame
+        self.keyframes = np.asarray(keyframes, dtype=np.int32)  # Sorted frame indices
+        self.fps = float(fps)
+
+    @property
+    def frame_count(self):
+        return len(self.timestamps)
+
+    @property
+    def duration(self):
+        if not self.frame_count:
+            return 0.0
+        return float(self.timestamps[-1]) + (1.0 / self.fps if self.fps > 0 else 0.0)
+
+    def frame_at(self, seconds):
+        """Index of the frame shown at `seconds` into the video"""
+        if not self.frame_count:
+            return 0
+        idx = int(np.searchsorted(self.timestamps, seconds, side='right')) - 1
+        return min(max(idx, 0), self.frame_count - 1)
+
+    def time_of(self, frame_index):
+        if not self.frame_count:
+            return frame_index / self.fps if self.fps > 0 else 0.0
+        return float(self.timestamps[min(max(frame_index, 0), self.frame_count - 1)])
+
+    def keyframe_before(self, frame_index):
+        """Closest keyframe at or before `frame_index`, or None if keyframes are unknown"""
+        if not len(self.keyframes):
+            return None
+        pos = int(np.searchsorted(self.keyframes, frame_index, side='right')) - 1
+        return int(self.keyframes[max(pos, 0)])
+
+    def save(self, path):
+        write_atomic(path, lambda f: np.savez_compressed(
+            f, timestamps=self.timestamps, keyframes=self.keyframes, fps=np.float32(self.fps)
+        ))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['timestamps'], data['keyframes'], float(data['fps']))
+
+
+def build_index(video_path):
+    """
+    Scan a video once and return its VideoIndex.
+
+    With PyAV only packets are demuxed (no decoding), so this is fast even for
+    multi-hour recordings. The OpenCV fallback has to grab every frame and
+    cannot see keyframe flags, so seeks then go straight to the target frame.
+    """
+    if av is not None:
+        try:
+            return _build_index_pyav(video_path)
+        except Exception as e:
+            logger.warning(f"PyAV indexing failed for {video_path}, falling back to OpenCV: {e}")
+    return _build_index_opencv(video_path)
+
+
+def _build_index_pyav(video_path):
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        time_base = float(stream.time_base)
+        fps = float(stream.average_rate or 0)
+        pts = []
+        key_pts = []
+        for packet in container.demux(stream):
+            if packet.pts is None:
+                continue
+            pts.append(packet.pts)
+            if packet.is_keyframe:
+                key_pts.append(packet.pts)
+
+    # Packets arrive in decode order; frames are numbered in presentation order
+    pts = np.sort(np.asarray(pts, dtype=np.int64))
+    start = pts[0] if len(pts) else 0
+    timestamps = (pts - start) * time_base
+    keyframes = np.searchsorted(pts, np.sort(np.asarray(key_pts, dtype=np.int64)))
+    return VideoIndex(timestamps, keyframes, fps)
+
+
+def _build_index_opencv(video_path):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        timestamps = []
+        while cap.grab():
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    finally:
+        cap.release()
+    return VideoIndex(timestamps, [], fps)
+
+
+class VideoIndexStore:
+    """Builds each video's index once and keeps it on disk, keyed by content hash"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, video_path):
+        """Return the VideoIndex for a file, building it if needed (blocking)"""
+        digest = get_result_cache().video_digest(video_path)[:32]
+        with self._lock:
+            index = self._indexes.get(digest)
+        if index is not None:
+            return index
+
+        path = self.cache_dir / f"{digest}.npz"
+        try:
+            index = VideoIndex.load(path)
+        except FileNotFoundError:
+            index = build_index(video_path)
+            index.save(path)
+            logger.info(f"Indexed {video_path}: {index.frame_count} frames, {len(index.keyframes)} keyframes")
+        except Exception as e:
+            logger.error(f"Rebuilding unreadable index {path}: {e}")
+            index = build_index(video_path)
+            index.save(path)
+
+        with self._lock:
+            self._indexes[digest] = index
+        return index
+
+
+# Singleton instance
+index_store = None
+
+def get_index_store():
+    """Get or create singleton index store instance"""
+    global index_store
+    if index_store is None:
+        index_store = VideoIndexStore(getattr(settings, 'VIDEO_INDEX_DIR', 'cache/index'))
+    return index_store
@@ -1,6 +1,19 @@
 # videostream/views.py
 from django.shortcuts import render
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, Http404, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+import json
+import asyncio
 from .model_interface import get_classifier
+from .recorder import phase_durations
+from .result_cache import get_result_cache
+from .consumers import VideoStreamConsumer
+from .catalogue import get_catalogue
+from .broadcast import get_broadcaster
+from .scheduler import get_scheduler
+from .metrics import get_metrics
+from .shadow import get_shadow
+from .profiler import SamplingProfiler, get_torch_capture, profile_lock
 import os
 from django.conf import settings
 import logging
@@ -33,7 +46,150 @@ def model_stats_view(request):
         'avg_inference_time': round(model.avg_inference_time * 1000, 2) if model.frames_processed > 0 else 0,
         'last_inference_time': round(model.last_inference_time * 1000, 2),
         'model_loaded': model.model is not None,
-        'classes': model.CLASSES
+        'classes': model.CLASSES,
+        'mode_stats': [
+            {'mode': mode, 'frames': stats['frames'], 'avg_time': round(stats['avg_time'] * 1000, 2)}
+            for mode, stats in model.mode_stats.items()
+        ],
+        'cascade': model.get_cascade_stats(),
+        'scheduler': get_scheduler().stats(),
+        'shadow': get_shadow().stats()
     }
     
-    return render(request, 'model_stats.html', context)
\ No newline at end of file
+    return render(request, 'model_stats.html', context)
+
+def session_phases_view(request, session_id):
+    """Return per-phase durations (seconds) for a recorded stream session"""
+    durations = phase_durations(session_id)
+    return JsonResponse({
+        'session_id': session_id,
+        'durations': {cls: round(seconds, 2) for cls, seconds in durations.items()}
+    })
+
+def video_catalogue_view(request):
+    """List the backend videos that clients can select with select_source"""
+    return JsonResponse({'videos': get_catalogue().list()})
+
+def timeline_view(request):
+    """Serve the cached phase timeline of an already-analysed catalogue video"""
+    source = get_catalogue().get(request.GET.get('video', ''))
+    if source is None:
+        raise Http404("Unknown video")
+    
+    model = get_classifier()
+    cache = get_result_cache()
+    key = cache.make_key(source['path'], model.model_version, VideoStreamConsumer.FRAME_PROCESS_INTERVAL)
+    timeline = cache.load(key)
+    if timeline is None:
+        raise Http404("Video has not been analysed yet")
+    
+    return JsonResponse({'video': source['id'], 'model_version': model.model_version, **timeline.to_dict()})
+
+async def get_source_broadcaster(source_id):
+    source = await sync_to_async(get_catalogue().get)(source_id)
+    if source is None:
+        raise Http404("Unknown video")
+    return get_broadcaster(source)
+
+def live_stream_headers(response):
+    """Live streams must be passed through by proxies, never buffered or cached"""
+    response['Cache-Control'] = 'no-cache, no-store, no-transform'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def mjpeg_stream_view(request, source_id):
+    """Annotated video of a catalogue source as multipart MJPEG, viewable in an <img> tag"""
+    broadcaster = await get_source_broadcaster(source_id)
+    
+    async def frames():
+        queue = broadcaster.subscribe()
+        try:
+            while True:
+                event = await queue.get()
+                if 'error' in event:
+                    break  # Refused by the inference scheduler
+                jpeg = event['jpeg']
+                yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(jpeg)) + jpeg + b'\r\n'
+        finally:
+            broadcaster.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(frames(), content_type='multipart/x-mixed-replace; boundary=frame')
+    return live_stream_headers(response)
+
+async def prediction_events_view(request, source_id):
+    """Phase predictions of a catalogue source as Server-Sent Events"""
+    broadcaster = await get_source_broadcaster(source_id)
+    
+    async def events():
+        queue = broadcaster.subscribe()
+        try:
+            yield 'retry: 2000\n\n'
+            while True:
+                event = await queue.get()
+                if 'error' in event:
+                    yield f"event: error\ndata: {json.dumps(event)}\n\n"
+                    break
+                yield f"id: {event['seq']}\nevent: prediction\ndata: {json.dumps(event['prediction'])}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    return live_stream_headers(response)
+
+async def live_stats_view(request):
+    """Rolling-window performance metrics pushed once a second as Server-Sent Events"""
+    async def events():
+        metrics = get_metrics()
+        scheduler = get_scheduler()
+        shadow = get_shadow()
+        yield 'retry: 2000\n\n'
+        while True:
+            data = {**metrics.snapshot(), 'scheduler': scheduler.stats(), 'shadow': shadow.stats()}
+            yield f"event: stats\ndata: {json.dumps(data)}\n\n"
+            await asyncio.sleep(1.0)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    return live_stream_headers(response)
+
+async def profile_view(request):
+    """
+    Staff only: sample every thread's stack for ?duration= seconds (default 10)
+    and return collapsed stacks for a flamegraph. With ?torch_calls=N the next N
+    predict() calls also run under torch.profiler and the response is JSON.
+    """
+    # request.user is lazy, so check it inside sync_to_async (request.auser() needs Django 5)
+    is_staff = await sync_to_async(lambda: request.user.is_active and request.user.is_staff)()
+    if not is_staff:
+        return HttpResponseForbidden("Staff only")
+    try:
+        duration = min(max(float(request.GET.get('duration', 10)), 0.1), 60)
+        interval = min(max(float(request.GET.get('interval', 5)), 1), 100) / 1000  # ms between samples
+        torch_calls = min(max(int(request.GET.get('torch_calls', 0)), 0), 20)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid profiling parameters'}, status=400)
+    
+    if not profile_lock.acquire(blocking=False):
+        return JsonResponse({'error': 'A profile is already running'}, status=409)
+    profiler = SamplingProfiler(interval)
+    capture = get_torch_capture()
+    try:
+        if torch_calls:
+            capture.arm(torch_calls)
+        profiler.start(duration)
+        await asyncio.sleep(duration)
+    finally:
+        profiler.stop()
+        torch_tables = capture.disarm()
+        profile_lock.release()
+    
+    if torch_calls:
+        return JsonResponse({
+            'duration': round(profiler.elapsed, 2),
+            'samples': profiler.samples,
+            'collapsed': profiler.collapsed(),
+            'torch': torch_tables,
+        })
+    response = HttpResponse(profiler.collapsed(), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="profile.folded"'
+    response['X-Profile-Samples'] = str(profiler.samples)
+    return response
@@ -144,6 +144,66 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Batched writer for streamed phase predictions (videostream.recorder)
+PREDICTION_RECORDER_BATCH_SIZE = 200  # Flush once this many rows are buffered
+PREDICTION_RECORDER_FLUSH_INTERVAL = 2.0  # ...or after this many seconds
+
+# Persistent cache of per-video phase timelines (videostream.result_cache)
+RESULT_CACHE_DIR = BASE_DIR / 'cache' / 'results'
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Evict least recently used entries above this size
+RESULT_CACHE_MAX_AGE = 30 * 24 * 3600  # Drop entries unused for 30 days
+
+# Per-video frame timestamp/keyframe indexes used for seeking (videostream.video_index)
+VIDEO_INDEX_DIR = BASE_DIR / 'cache' / 'index'
+
+# Backend video catalogue (videostream.catalogue)
+VIDEO_SOURCE_DIRS = ['demo']  # Scanned for .mp4/.avi/.mov/.mkv files, relative to the working directory
+VIDEO_CATALOGUE_FILE = BASE_DIR / 'cache' / 'catalogue.json'
+VIDEO_CATALOGUE_RESCAN_INTERVAL = 60  # Seconds between directory rescans
+
+# JPEG encoding of outgoing frames (videostream.encoding)
+JPEG_TARGET_BYTES = None  # Default per-frame byte budget; None keeps fixed quality
+JPEG_ENCODER_THREADS = 4  # Shared encode thread pool size
+JPEG_USE_TURBO = True  # Use PyTurboJPEG when it is installed
+
+# Video decoding (videostream.decoders)
+VIDEO_DECODER = 'auto'  # 'opencv', 'pyav', or 'auto' to probe both on first use and keep the faster
+VIDEO_DECODE_MAX_WIDTH = None  # Decode at reduced resolution above this width (e.g. 960)
+VIDEO_DECODE_THREADS = 0  # PyAV decoder threads per stream; 0 picks one per core
+VIDEO_DECODE_HW_ACCEL = False  # Let OpenCV use a hardware decoder when one exists
+
+# Inference budget shared by all streams on this node (videostream.scheduler)
+INFERENCE_BUDGET_FPS = 30.0  # Model calls per second across all streams
+INFERENCE_STREAM_FPS = 10.0  # Hard per-stream quota
+INFERENCE_MAX_STREAMS = 16  # Further connections are rejected
+
+# Batched (multi-source) prediction output (videostream.scores)
+PHASE_THRESHOLDS = {}  # {class name: minimum probability}; results below it are reported as 'Uncertain'
+PREDICTION_TOP_K = 3  # Best phases listed with each multi-source result, 0 to leave them out
+
+# Graceful shutdown (videostream.lifecycle)
+SHUTDOWN_DRAIN_TIMEOUT = 10.0  # Seconds to let in-flight frames finish on SIGTERM
+SHUTDOWN_RETRY_AFTER = 5.0  # Reconnect delay (s) suggested to clients of a draining node
+
+# Resumable sessions (videostream.sessions)
+SESSION_RESUME_TTL = 120.0  # Seconds a dropped stream's state is kept for ?resume=<token>
+SESSION_RESUME_MAX = 256  # Oldest saved sessions are evicted beyond this
+# Saved sessions live in this server process unless this names a CACHES alias shared by every worker
+# (e.g. django.core.cache.backends.redis.RedisCache); only then can a client resume on another worker or node
+SESSION_RESUME_CACHE = None
+
+# Shadow evaluation of a candidate model on live frames (videostream.shadow); off unless both paths are set
+SHADOW_MODEL_CONFIG = None  # e.g. 'wearable_project/model/configs/resnet/5757project.py'
+SHADOW_MODEL_WEIGHTS = None  # e.g. 'wearable_project/model/candidate.pth'
+SHADOW_SAMPLE_RATE = 0.1  # Fraction of freshly classified frames also scored by the candidate
+SHADOW_MAX_PENDING = 4  # Samples arriving while this many wait are dropped
+SHADOW_MAX_SAMPLES = 50  # Disagreements kept for review
+SHADOW_SAMPLE_DIR = BASE_DIR / 'cache' / 'shadow'  # Thumbnails of kept disagreements
+
+# Session recording for the replay_session command (videostream.replay)
+SESSION_RECORD_DIR = None  # e.g. BASE_DIR / 'cache' / 'sessions' to record every connection's client messages
+SESSION_REPLAY_SUITE = BASE_DIR / 'regression'  # <name>.wprs recordings with <name>.json baselines for `pdm run regression`
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',